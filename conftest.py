@@ -0,0 +1,34 @@
+import pytest
+
+# markers skipped unless their option is passed
+OPT_IN_MARKERS = {
+    "slow": "--run-slow",
+    "benchmark": "--run-benchmark",
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", default=False, help="Run tests marked slow.")
+    parser.addoption("--run-benchmark", action="store_true", default=False, help="Run timing benchmarks marked benchmark.")
+
+
+def pytest_collection_modifyitems(config, items):
+    for marker, option in OPT_IN_MARKERS.items():
+        if config.getoption(option):
+            continue
+
+        skip = pytest.mark.skip(reason=f"needs {option}")
+        for item in items:
+            if marker in item.keywords:
+                item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter):
+    # measurements recorded by tests with record_property
+    reports = [report for report in terminalreporter.getreports("passed") if report.when == "call" and report.user_properties]
+    if not reports:
+        return
+
+    terminalreporter.section("measurements")
+    for report in reports:
+        terminalreporter.write_line(f"{report.nodeid}: " + ", ".join(f"{name} {value}" for name, value in report.user_properties))
@@ -2,11 +2,18 @@ from epics import PV, dbr
 import click
 import time
 from datetime import datetime
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from functools import partial
 from lume_services.models import Model
 from lume_services.config import configure
+from lume_distgen_impact_cu_inj.metadata import DEVICE_RANGES
+from lume_distgen_impact_cu_inj.vcc import save_vcc_array
+
+logger = logging.getLogger(__name__)
 
 
 PVNAME_TO_INPUT_MAP = {
@@ -58,13 +65,274 @@ IMPACT_SETTINGS = {
 }
 
 
-def monitor_callback(parameter_values, pv_collection_time, pvname, value, timestamp, **kwargs):
-    pv_collection_time = timestamp
-    if isinstance(value, np.ndarray):
-        parameter_values[pvname] = value.tolist()
+# Fraction of the device range in cu_inj_impact.csv below which a change is ignored
+DEADBAND_FRACTION = 1e-3
+
+# Relative change in the image block sums below which the VCC image is
+# considered unchanged
+IMAGE_TOLERANCE = 1e-2
+IMAGE_BLOCKS = 256
+
+IMAGE_PVNAMES = ["CAMR:IN20:186:IMAGE"]
+
+
+def get_deadbands(deadband_fraction):
+    """
+    Builds per-PV deadbands from the device ranges in the CU_INJ mapping table.
+    """
+    return {
+        pv_name: deadband_fraction * abs(device_max - device_min)
+        for pv_name, (device_min, device_max) in DEVICE_RANGES.items()
+    }
+
+
+def image_block_sums(value, n_blocks=IMAGE_BLOCKS):
+    """
+    Sums the flattened image over n_blocks contiguous blocks. Comparing the
+    block sums is much cheaper than comparing full frames and is insensitive to
+    single hot pixels.
+    """
+    value = np.asarray(value, dtype=np.float64).ravel()
+    if value.size == 0:
+        return np.zeros(n_blocks)
+
+    edges = np.linspace(0, value.size, n_blocks, endpoint=False).astype(np.intp)
+    return np.add.reduceat(value, edges)
+
+
+class ChangeDetector:
+    """
+    Tracks the last submitted PV values and reports whether a new set of values
+    differs by a physically meaningful amount. Scalar PVs use the absolute
+    deadbands passed, image PVs are compared by their block sums
+    and all other PVs must match exactly.
+    """
+
+    def __init__(self, deadbands, image_pvnames=IMAGE_PVNAMES, image_tolerance=IMAGE_TOLERANCE):
+        self._deadbands = deadbands
+        self._image_pvnames = set(image_pvnames)
+        self._image_tolerance = image_tolerance
+        self._last = None
+
+    def _differs(self, pvname, previous, value):
+        if pvname in self._image_pvnames:
+            previous_norm = np.abs(previous).sum()
+            return np.abs(value - previous).sum() > self._image_tolerance * previous_norm
+
+        deadband = self._deadbands.get(pvname)
+        if deadband is not None and value is not None and previous is not None:
+            return abs(value - previous) > deadband
+
+        if isinstance(value, np.ndarray) or isinstance(previous, np.ndarray):
+            return not np.array_equal(value, previous)
+
+        return value != previous
+
+    def _summarize(self, values):
+        return {
+            pvname: image_block_sums(value) if pvname in self._image_pvnames else value
+            for pvname, value in values.items()
+        }
+
+    def changed(self, values):
+        """
+        Returns True if values differ from the last update beyond tolerance.
+        """
+        if self._last is None:
+            return True
+
+        summary = self._summarize(values)
+
+        return any(
+            self._differs(pvname, self._last.get(pvname), value)
+            for pvname, value in summary.items()
+        )
+
+    def update(self, values):
+        self._last = self._summarize(values)
+
+
+class RunScheduler:
+    """
+    Runs submissions on a bounded pool of worker threads so that the polling
+    loop never blocks on a model run. At most max_in_flight runs execute at once
+    and at most one submission waits behind them: a newer submission replaces
+    the waiting one, which is counted as dropped.
+    """
+
+    def __init__(self, run, max_in_flight=1):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+
+        self._run = run
+        self._max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="run-scheduler")
+
+        # reentrant: a done callback may fire synchronously from _start
+        self._lock = threading.RLock()
+        self._in_flight = 0
+        self._pending = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def queue_depth(self):
+        """
+        Number of runs executing or waiting to execute.
+        """
+        with self._lock:
+            return self._in_flight + (self._pending is not None)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._in_flight + (self._pending is not None),
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+    def submit(self, parameters):
+        with self._lock:
+            self.submitted += 1
+
+            if self._in_flight < self._max_in_flight:
+                self._start(parameters)
+
+            else:
+                # latest wins
+                if self._pending is not None:
+                    self.dropped += 1
+                self._pending = parameters
+
+    def _start(self, parameters):
+        self._in_flight += 1
+        future = self._executor.submit(self._run, parameters)
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        exception = future.exception()
+        if exception is not None:
+            logger.error(f"Model run failed: {exception!r}")
+
+        with self._lock:
+            self._in_flight -= 1
+
+            if exception is None:
+                self.completed += 1
+            else:
+                self.failed += 1
 
-    else:
-        parameter_values[pvname] = value
+            if self._pending is not None:
+                parameters, self._pending = self._pending, None
+                self._start(parameters)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+                self._pending = None
+
+        self._executor.shutdown(wait=wait)
+
+
+class VCCImageFiles:
+    """
+    Writes the VCC frames of runs to directory as they start and removes each
+    file once no running submission uses it, so that frames of dropped
+    submissions are never written and finished runs leave nothing behind.
+    Identical frames share a file, counted once per run using it.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def acquire(self, array):
+        """
+        Returns the path of the file holding array, writing it if needed
+        """
+        with self._lock:
+            filename = save_vcc_array(array, self._directory)
+            self._users[filename] = self._users.get(filename, 0) + 1
+
+        return filename
+
+    def release(self, filename):
+        with self._lock:
+            self._users[filename] -= 1
+
+            if not self._users[filename]:
+                del self._users[filename]
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+
+
+class PVSnapshot:
+    """
+    Double-buffered store of the latest value and EPICS timestamp of each PV.
+
+    Channel access callbacks replace a PV's (value, timestamp) entry in the
+    live buffer with a single dict assignment, which is atomic under the GIL,
+    so writers never wait on a lock. snapshot() publishes a consistent copy of
+    the live buffer with a single dict copy, so a reader never sees a
+    partially updated set of PVs.
+    """
+
+    def __init__(self, pvnames):
+        self._live = {pvname: None for pvname in pvnames}
+        self._published = {}
+
+    @property
+    def published(self):
+        """
+        The (value, timestamp) entries of the last consistent snapshot.
+        """
+        return self._published
+
+    def update(self, pvname, value, timestamp):
+        # pyepics may reuse array buffers between callbacks
+        if isinstance(value, np.ndarray):
+            value = value.copy()
+
+        self._live[pvname] = (value, timestamp)
+
+    def snapshot(self, stamp="max"):
+        """
+        Returns the PV values and their collection time from a consistent copy.
+        The collection time is the max or median of the PV timestamps. Returns
+        None until every PV has reported a value.
+        """
+        published = self._live.copy()
+
+        if any(entry is None for entry in published.values()):
+            return None
+
+        self._published = published
+        timestamps = [timestamp for _, timestamp in published.values()]
+
+        if stamp == "max":
+            collection_time = max(timestamps)
+        elif stamp == "median":
+            collection_time = float(np.median(timestamps))
+        else:
+            raise ValueError(f"Unknown snapshot stamp {stamp}, use max or median.")
+
+        values = {pvname: value for pvname, (value, _) in published.items()}
+        return values, datetime.fromtimestamp(collection_time)
+
+
+def monitor_callback(pv_snapshot, pvname, value, timestamp, **kwargs):
+    pv_snapshot.update(pvname, value, timestamp)
 
 
 @click.command()
@@ -72,14 +340,30 @@ def monitor_callback(parameter_values, pv_collection_time, pvname, value, timest
 @click.argument("deployment_id")
 @click.argument("dashboard_dir")
 @click.argument("archive_dir")
-def main(model_id, deployment_id, dashboard_dir, archive_dir):
+@click.option("--deadband-fraction", default=DEADBAND_FRACTION, show_default=True, help="Fraction of each device range treated as noise.")
+@click.option("--image-tolerance", default=IMAGE_TOLERANCE, show_default=True, help="Relative VCC image change treated as noise.")
+@click.option("--max-in-flight", default=1, show_default=True, help="Maximum number of concurrent model runs.")
+@click.option("--timestamp", type=click.Choice(["max", "median"]), default="max", show_default=True, help="PV timestamp statistic used as the collection time.")
+@click.option("--image-dir", default=None, help="Mounted directory for VCC image files. Defaults to archive_dir.")
+@click.option("--dashboard-mode", type=click.Choice(["render", "deferred"]), default="render", show_default=True, help="Render dashboards in each run, or store their data for render-dashboard.")
+@click.option("--fidelity-mode", type=click.Choice(["full", "progressive"]), default="full", show_default=True, help="Publish a low-fidelity result before each full-fidelity run.")
+@click.option("--command-mpi", default=IMPACT_CONFIGURATION["command_mpi"], help="MPI build of Impact-T, e.g. ImpactTexe-mpi, required by --auto-numprocs.")
+@click.option("--auto-numprocs/--fixed-numprocs", default=False, show_default=True, help="Size Impact MPI runs from the available cores and measured scaling.")
+@click.option("--calibration-file", default=None, help="Calibration written by calibrate-impact, sets the grid and particle count of each run.")
+@click.option("--calibration-tolerance", default=0.05, show_default=True, help="Relative error tolerance on end_norm_emit_x/y and end_sigma_z for --calibration-file.")
+@click.option("--surrogate-file", default=None, help="Trained SurrogateImpactModel file, previews outputs ahead of each simulation.")
+@click.option("--surrogate-dir", default=None, help="Mounted directory for surrogate previews. Defaults to dashboard_dir.")
+def main(model_id, deployment_id, dashboard_dir, archive_dir, deadband_fraction, image_tolerance, max_in_flight, timestamp, image_dir, dashboard_mode, fidelity_mode, command_mpi, auto_numprocs, calibration_file, calibration_tolerance, surrogate_file, surrogate_dir):
     global PVNAME_TO_INPUT_MAP, IMPACT_SETTINGS, DISTGEN_CONFIGURATION, IMPACT_CONFIGURATION, DISTGEN_SETTINGS
 
+    if auto_numprocs and not command_mpi:
+        raise click.UsageError("--auto-numprocs requires --command-mpi")
+
     configure()
 
     pvs = {}
     parameter_values = {
-        "impact_configuration": IMPACT_CONFIGURATION, 
+        "impact_configuration": {**IMPACT_CONFIGURATION, "command_mpi": command_mpi}, 
         "impact_settings": IMPACT_SETTINGS, 
         "distgen_configuration": DISTGEN_CONFIGURATION, 
         "distgen_settings": DISTGEN_SETTINGS,
@@ -87,37 +371,88 @@ def main(model_id, deployment_id, dashboard_dir, archive_dir):
         "dashboard_image_filesystem_identifier": "mounted",
         "archive_dir": archive_dir,
         "dashboard_dir": dashboard_dir, 
+        "dashboard_mode": dashboard_mode,
+        "fidelity_mode": fidelity_mode,
+        "auto_numprocs": auto_numprocs,
+        "calibration_file": calibration_file,
+        "calibration_tolerance": calibration_tolerance,
+        "surrogate_file": surrogate_file,
+        "surrogate_dir": surrogate_dir or dashboard_dir,
     }
-    pv_collection_isotime = None
+    pv_snapshot = PVSnapshot(PVNAME_TO_INPUT_MAP.keys())
 
-    for pvname in PVNAME_TO_INPUT_MAP.keys():
-        parameter_values[pvname] = None
+    if image_dir is None:
+        image_dir = archive_dir
 
     model = Model(model_id = model_id, deployment_id=deployment_id)
 
-    pv_collection_isotime = datetime.now()
+    image_files = VCCImageFiles(image_dir)
+
+    def run(parameters):
+        # pass the image by file rather than as a JSON list of pixels, written
+        # only once the submission runs and removed when the flow has finished
+        parameters = dict(parameters)
+        filenames = []
+        try:
+            for pvname in IMAGE_PVNAMES:
+                filename = image_files.acquire(parameters.pop(pvname))
+                filenames.append(filename)
+                parameters[f"{PVNAME_TO_INPUT_MAP[pvname]}_file"] = filename
+
+            return model.run_and_return(parameters=parameters)
+
+        finally:
+            for filename in filenames:
+                image_files.release(filename)
+
+    change_detector = ChangeDetector(get_deadbands(deadband_fraction), image_tolerance=image_tolerance)
+    scheduler = RunScheduler(run, max_in_flight=max_in_flight)
 
     for pvname in PVNAME_TO_INPUT_MAP.keys():
         pvs[pvname] = PV(pvname, auto_monitor=dbr.DBE_VALUE)
-        pvs[pvname].add_callback(partial(monitor_callback, parameter_values,pv_collection_isotime))
+        pvs[pvname].add_callback(partial(monitor_callback, pv_snapshot))
 
     try:
         while True:
             time.sleep(0.1)
-            print("Evaluating model...")
+
             # only queue model once all have values
-            if not any([parameter_val is None for parameter_val in parameter_values.values()]):
+            snapshot = pv_snapshot.snapshot(stamp=timestamp)
+            if snapshot is None:
+                continue
+
+            pv_values, pv_collection_time = snapshot
+
+            # skip resubmission until the machine has moved
+            if not change_detector.changed(pv_values):
+                continue
 
-                parameter_values["pv_collection_isotime"] = pv_collection_isotime.isoformat()
+            change_detector.update(pv_values)
+
+            parameters = dict(parameter_values)
+            parameters.update(
+                {
+                    pvname: value.tolist() if isinstance(value, np.ndarray) else value
+                    for pvname, value in pv_values.items()
+                    if pvname not in IMAGE_PVNAMES
+                }
+            )
+
+            # images stay in memory until the submission runs
+            for pvname in IMAGE_PVNAMES:
+                parameters[pvname] = pv_values[pvname]
+            parameters["pv_collection_isotime"] = pv_collection_time.isoformat()
+
+            # non-blocking
+            scheduler.submit(parameters)
+            print(f"Queued model evaluation... {scheduler.stats}")
 
-                # blocking call
-                model.run_and_return(
-                    parameters = parameter_values
-                )
     except KeyboardInterrupt:
         for pv in pvs.values():
             pv.clear_auto_monitor()
 
+        scheduler.shutdown(wait=False)
+
 
 
 if __name__ == "__main__":
@@ -1,20 +1,85 @@
 from lume_distgen_impact_cu_inj.files import IMPACT_VARIABLE_FILE, DISTGEN_VARIABLE_FILE, CU_INJ_MAPPING, DEFAULT_VCC_ARRAY_FILE
-from lume_model.utils import variables_from_yaml
-import pandas as pd
-import numpy as np
+import threading
 
-CU_INJ_MAPPING_TABLE= pd.read_csv(CU_INJ_MAPPING)
-CU_INJ_MAPPING_TABLE.set_index("impact_name")
+# The attributes below need pandas, lume-model, the default VCC frame or the
+# parsed metadata files and are loaded on first access (PEP 562), so that
+# importing the package for names stays cheap. Each loader returns the
+# attributes it defines.
 
-with open(IMPACT_VARIABLE_FILE, "r") as f:
-    IMPACT_INPUT_VARIABLES, IMPACT_OUTPUT_VARIABLES = variables_from_yaml(f)
 
+def _load_metadata():
+    from lume_distgen_impact_cu_inj.metadata import IMPACT_FACTORS
 
-with open(DISTGEN_VARIABLE_FILE, "r") as f:
-    DISTGEN_INPUT_VARIABLES, DISTGEN_OUTPUT_VARIABLES = variables_from_yaml(f)
+    return {"IMPACT_FACTORS": IMPACT_FACTORS}
 
-DEFAULT_VCC_ARRAY = np.load(DEFAULT_VCC_ARRAY_FILE)
-DISTGEN_INPUT_VARIABLES["vcc_array"].default = DEFAULT_VCC_ARRAY
+
+def _load_mapping_table():
+    import pandas as pd
+
+    return {"CU_INJ_MAPPING_TABLE": pd.read_csv(CU_INJ_MAPPING)}
+
+
+def _load_impact_variables():
+    import numpy as np
+    from lume_distgen_impact_cu_inj.cache import load_variables
+
+    input_variables, output_variables = load_variables(IMPACT_VARIABLE_FILE)
+
+    # scale factors aligned with IMPACT_INPUT_VARIABLES, unmapped variables are unscaled
+    input_factors = np.array([__getattr__("IMPACT_FACTORS").get(var_name, 1.0) for var_name in input_variables])
+    input_factors.setflags(write=False)
+
+    return {
+        "IMPACT_INPUT_VARIABLES": input_variables,
+        "IMPACT_OUTPUT_VARIABLES": output_variables,
+        "IMPACT_INPUT_FACTORS": input_factors,
+    }
+
+
+def _load_default_vcc_array():
+    import numpy as np
+
+    return {"DEFAULT_VCC_ARRAY": np.load(DEFAULT_VCC_ARRAY_FILE)}
+
+
+def _load_distgen_variables():
+    from lume_distgen_impact_cu_inj.cache import load_variables
+
+    input_variables, output_variables = load_variables(DISTGEN_VARIABLE_FILE)
+
+    input_variables["vcc_array"].default = __getattr__("DEFAULT_VCC_ARRAY")
+
+    return {"DISTGEN_INPUT_VARIABLES": input_variables, "DISTGEN_OUTPUT_VARIABLES": output_variables}
+
+
+_LAZY_ATTRIBUTES = {
+    "IMPACT_FACTORS": _load_metadata,
+    "CU_INJ_MAPPING_TABLE": _load_mapping_table,
+    "IMPACT_INPUT_VARIABLES": _load_impact_variables,
+    "IMPACT_OUTPUT_VARIABLES": _load_impact_variables,
+    "IMPACT_INPUT_FACTORS": _load_impact_variables,
+    "DEFAULT_VCC_ARRAY": _load_default_vcc_array,
+    "DISTGEN_INPUT_VARIABLES": _load_distgen_variables,
+    "DISTGEN_OUTPUT_VARIABLES": _load_distgen_variables,
+}
+
+# flow tasks may run on threads, each attribute is loaded once
+_lazy_lock = threading.RLock()
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    with _lazy_lock:
+        if name not in globals():
+            globals().update(_LAZY_ATTRIBUTES[name]())
+
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
 
 
 from . import _version
@@ -0,0 +1,340 @@
+import fcntl
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+from pmd_beamphysics import ParticleGroup
+
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+
+
+def _canonical(obj):
+    """
+    Converts nested inputs into a JSON-serializable form with a stable ordering.
+    Arrays are represented by dtype, shape and a digest of their buffer.
+    """
+    if isinstance(obj, dict):
+        return {str(key): _canonical(val) for key, val in sorted(obj.items(), key=lambda item: str(item[0]))}
+
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(val) for val in obj]
+
+    if isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        return {
+            "__ndarray__": hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest(),
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+        }
+
+    if isinstance(obj, np.generic):
+        return _canonical(obj.item())
+
+    # pint quantities
+    if hasattr(obj, "magnitude") and hasattr(obj, "units"):
+        return {"__quantity__": _canonical(obj.magnitude), "units": str(obj.units)}
+
+    if isinstance(obj, float):
+        # repr round-trips exactly, so 0.1 and 0.1000000001 hash differently
+        return repr(obj)
+
+    if obj is None or isinstance(obj, (bool, int, str)):
+        return obj
+
+    return str(obj)
+
+
+def canonical_hash(*objs):
+    """
+    Returns a hex digest identifying the given inputs independent of dict ordering.
+    """
+    payload = json.dumps([_canonical(obj) for obj in objs], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _atomic_write(filename, data: bytes):
+    dirname = os.path.dirname(filename)
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def snapshot_dir():
+    """
+    Per-user directory for variable snapshots, under XDG_CACHE_HOME or ~/.cache
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "lume_distgen_impact_cu_inj")
+
+
+def _snapshot_filename(filename):
+    # installs of different versions share the cache directory
+    filename = os.path.abspath(filename)
+    digest = hashlib.blake2b(filename.encode(), digest_size=8).hexdigest()
+    return os.path.join(snapshot_dir(), f"{os.path.basename(filename)}-{digest}.pkl")
+
+
+def load_variables(filename, snapshot_filename=None):
+    """
+    Returns the input and output variables defined in the YAML file filename.
+
+    Parsed variables are pickled to snapshot_filename, by default in the
+    per-user snapshot_dir so that installed packages are never written to,
+    along with a digest of the YAML and the lume-model version. Later loads
+    unpickle the snapshot while both match and parse the YAML again otherwise.
+    """
+    import lume_model
+    from lume_model.utils import variables_from_yaml
+
+    if snapshot_filename is None:
+        snapshot_filename = _snapshot_filename(filename)
+
+    with open(filename, "rb") as f:
+        source = f.read()
+
+    stamp = (hashlib.sha256(source).hexdigest(), lume_model.__version__)
+
+    try:
+        with open(snapshot_filename, "rb") as f:
+            snapshot_stamp, variables = pickle.load(f)
+        if snapshot_stamp == stamp:
+            return variables
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # written by an incompatible lume-model, rebuilt below
+        logger.debug(f"Ignoring variable snapshot {snapshot_filename}: {e}")
+
+    variables = variables_from_yaml(io.StringIO(source.decode()))
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(snapshot_filename)), mode=0o700, exist_ok=True)
+        _atomic_write(snapshot_filename, pickle.dumps((stamp, variables), protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        # without a writable cache directory the YAML is parsed on every start
+        logger.debug(f"Unable to write variable snapshot {snapshot_filename}: {e}")
+
+    return variables
+
+
+class ResultCache:
+    """
+    Persistent, size-bounded cache of flow results stored as one pickle per key
+    in cache_dir. Entries are evicted least-recently-used first, using the file
+    modification time as the access stamp so the ordering survives restarts.
+    """
+
+    _STATS_FILENAME = "_stats.json"
+    _STATS_LOCK_FILENAME = "_stats.lock"
+    _SUFFIX = ".pkl"
+
+    def __init__(self, cache_dir: str, max_entries: int = 128):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+
+        self._cache_dir = str(cache_dir)
+        self._max_entries = max_entries
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, f"{key}{self._SUFFIX}")
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self._cache_dir):
+            if filename.endswith(self._SUFFIX) and not filename.startswith("."):
+                path = os.path.join(self._cache_dir, filename)
+                try:
+                    entries.append((os.stat(path).st_mtime_ns, path))
+                except FileNotFoundError:
+                    # evicted by a concurrent writer
+                    continue
+        return sorted(entries)
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self._cache_dir, self._STATS_FILENAME), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _increment(self, counter, n=1):
+        # flows sharing cache_dir update the counters concurrently, the
+        # read-modify-write holds an exclusive lock so no increment is lost
+        with open(os.path.join(self._cache_dir, self._STATS_LOCK_FILENAME), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                stats = self._read_stats()
+                stats[counter] = stats.get(counter, 0) + n
+                _atomic_write(os.path.join(self._cache_dir, self._STATS_FILENAME), json.dumps(stats).encode())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @property
+    def stats(self):
+        """
+        Hit, miss and eviction counters accumulated over the life of cache_dir.
+        """
+        stats = self._read_stats()
+        stats.update({"size": len(self), "max_entries": self._max_entries})
+        return stats
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        path = self._path(key)
+
+        try:
+            with open(path, "rb") as f:
+                value = self._load(f)
+        except FileNotFoundError:
+            self._increment("misses")
+            logger.info(f"Result cache miss for {key}, {self.stats}")
+            return default
+
+        self._touch(path)
+        self._increment("hits")
+        logger.info(f"Result cache hit for {key}, {self.stats}")
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        _atomic_write(path, self._dumps(value))
+        self._touch(path)
+        self._evict()
+
+    def _dumps(self, value) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _load(self, f):
+        return pickle.load(f)
+
+    def _touch(self, path):
+        """
+        Marks path as most recently used. Filesystem timestamps can be coarser
+        than the access rate, so the stamp is forced past the newest entry.
+        """
+        entries = self._entries()
+        newest = entries[-1][0] if entries else 0
+        stamp = max(time.time_ns(), newest + 1)
+        os.utime(path, ns=(stamp, stamp))
+
+    def _evict(self):
+        entries = self._entries()
+        n_evict = len(entries) - self._max_entries
+
+        if n_evict > 0:
+            for _, path in entries[:n_evict]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+            self._increment("evictions", n_evict)
+
+    def clear(self):
+        for _, path in self._entries():
+            os.remove(path)
+
+
+class ParticleCache(ResultCache):
+    """
+    ResultCache of ParticleGroups, stored as compressed .npz particle arrays
+    rather than pickles.
+    """
+
+    _SUFFIX = ".npz"
+    _FINGERPRINT_SUFFIX = ".fingerprint"
+
+    def _fingerprint_path(self, key):
+        return os.path.join(self._cache_dir, f"{key}{self._FINGERPRINT_SUFFIX}")
+
+    def put(self, key, value, fingerprint=None):
+        """
+        fingerprint, any picklable object, is stored with the entry for nearest
+        """
+        super().put(key, value)
+
+        if fingerprint is not None:
+            _atomic_write(self._fingerprint_path(key), pickle.dumps(fingerprint, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def nearest(self, fingerprint, distance):
+        """
+        Finds the entry whose stored fingerprint is nearest to fingerprint by
+        distance(fingerprint, stored_fingerprint)
+
+        Returns its key and the distance, or None and inf without fingerprinted
+        entries
+        """
+        nearest_key, nearest_distance = None, np.inf
+
+        for filename in os.listdir(self._cache_dir):
+            if not filename.endswith(self._FINGERPRINT_SUFFIX) or filename.startswith("."):
+                continue
+
+            key = filename[:-len(self._FINGERPRINT_SUFFIX)]
+            path = os.path.join(self._cache_dir, filename)
+
+            # drop fingerprints of evicted entries
+            if key not in self:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+
+            try:
+                with open(path, "rb") as f:
+                    stored = pickle.load(f)
+            except FileNotFoundError:
+                continue
+
+            d = distance(fingerprint, stored)
+            if d < nearest_distance:
+                nearest_key, nearest_distance = key, d
+
+        return nearest_key, nearest_distance
+
+    def clear(self):
+        super().clear()
+
+        for filename in os.listdir(self._cache_dir):
+            if filename.endswith(self._FINGERPRINT_SUFFIX):
+                os.remove(os.path.join(self._cache_dir, filename))
+
+    def _dumps(self, particle_group) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **particle_group._data)
+        return buffer.getvalue()
+
+    def _load(self, f):
+        with np.load(f) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        arrays["species"] = str(arrays["species"])
+        return ParticleGroup(data=arrays)
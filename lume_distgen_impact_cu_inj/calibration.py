@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import tempfile
+from time import time
+
+import click
+import numpy as np
+from lume_distgen_impact_cu_inj import DISTGEN_INPUT_VARIABLES, IMPACT_INPUT_VARIABLES
+from lume_distgen_impact_cu_inj.files import IMPACT_ARCHIVE_FILE, DISTGEN_INPUT_FILE
+from lume_distgen_impact_cu_inj.model import DistgenModel, ImpactModel, LUMEConfiguration, _input_variables
+
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+
+# outputs the requested tolerance applies to
+CALIBRATION_OUTPUTS = ["end_norm_emit_x", "end_norm_emit_y", "end_sigma_z"]
+
+# swept space-charge grids, cubic and powers of 2 for the FFT solver, and particle counts
+CALIBRATION_GRIDS = [8, 16, 32]
+CALIBRATION_N_PARTICLES = [1000, 3000, 10000]
+
+# finer than the sweep, errors are relative to this run
+REFERENCE_GRID = 64
+REFERENCE_N_PARTICLE = 30000
+
+# prepared distgen inputs, total_charge in pC, other inputs take their defaults
+CALIBRATION_DISTGEN_INPUTS = {"total_charge": 250}
+
+# relative errors below this are treated as converged when fitting
+_ERROR_FLOOR = 1e-4
+
+
+def _error_basis(grid, n_particle):
+    # statistical noise falls as n_particle**-1/2, second order discretization error as grid**-2
+    return np.column_stack([np.power(n_particle, -0.5), np.power(grid, -2.0)])
+
+
+def _fit_error(grid, n_particle, error):
+    """
+    Non-negative fit of error = A / sqrt(n_particle) + B / grid**2 in relative terms
+    """
+    basis = _error_basis(np.asarray(grid, dtype=float), np.asarray(n_particle, dtype=float))
+    error = np.asarray(error, dtype=float)
+    weight = 1 / np.maximum(error, _ERROR_FLOOR)
+
+    best = None
+    # each term alone or both, keeping non-negative solutions
+    for columns in ([0, 1], [0], [1]):
+        coefficients = np.zeros(2)
+        coefficients[columns], *_ = np.linalg.lstsq(basis[:, columns] * weight[:, None], error * weight, rcond=None)
+
+        if np.all(coefficients >= 0):
+            residual = np.sum(((basis @ coefficients - error) * weight) ** 2)
+            if best is None or residual < best[0]:
+                best = (residual, coefficients)
+
+    return best[1].tolist() if best is not None else [0.0, 0.0]
+
+
+def _eval_error(coefficients, grid, n_particle):
+    return _error_basis(np.atleast_1d(np.asarray(grid, dtype=float)), np.atleast_1d(np.asarray(n_particle, dtype=float))) @ np.asarray(coefficients)
+
+
+def _fit_log_linear(grid, n_particle, y):
+    """
+    Least squares fit of log(y) = a + b * log(n_particle) + c * log(grid**3)
+    """
+    A = np.column_stack([np.ones(len(grid)), np.log(n_particle), 3 * np.log(grid)])
+    coefficients, *_ = np.linalg.lstsq(A, np.log(y), rcond=None)
+    return coefficients.tolist()
+
+
+def _eval_log_linear(coefficients, grid, n_particle):
+    a, b, c = coefficients
+    return np.exp(a + b * np.log(n_particle) + 3 * c * np.log(grid))
+
+
+def _settings(grid, n_particle):
+    return {
+        "distgen": {"n_particle": int(n_particle)},
+        "impact": {"header:Nx": int(grid), "header:Ny": int(grid), "header:Nz": int(grid)},
+    }
+
+
+class Calibration:
+    """
+    Run times and outputs of a sweep over cubic space-charge grids and particle
+    counts, with a reference run at higher resolution. Run time is fit as a
+    power law in the particle count and number of grid cells. The relative
+    error of each of CALIBRATION_OUTPUTS against the reference is fit as
+    A / sqrt(n_particle) + B / grid**2. suggest returns the cheapest
+    configuration meeting a tolerance.
+
+    records are dicts of grid, n_particle, run_time and outputs
+    """
+
+    def __init__(self, records, reference):
+        if len(records) < 3:
+            raise ValueError(f"At least 3 sweep records are required to fit, got {len(records)}")
+
+        self._records = list(records)
+        self._reference = reference
+
+        grid = np.array([record["grid"] for record in self._records], dtype=float)
+        n_particle = np.array([record["n_particle"] for record in self._records], dtype=float)
+
+        self._run_time_model = _fit_log_linear(grid, n_particle, [record["run_time"] for record in self._records])
+        self._error_models = {
+            var_name: _fit_error(grid, n_particle, self.errors(var_name)) for var_name in CALIBRATION_OUTPUTS
+        }
+
+    @property
+    def records(self):
+        return list(self._records)
+
+    @property
+    def reference(self):
+        return self._reference
+
+    def errors(self, var_name):
+        """
+        Measured relative errors of var_name against the reference, one per record
+        """
+        reference = self._reference["outputs"][var_name]
+        return np.array([abs(record["outputs"][var_name] - reference) / abs(reference) for record in self._records])
+
+    def predict_run_time(self, grid, n_particle):
+        return _eval_log_linear(self._run_time_model, grid, n_particle)
+
+    def predict_error(self, grid, n_particle):
+        """
+        Largest predicted relative error over CALIBRATION_OUTPUTS
+        """
+        error = np.max(
+            [_eval_error(coefficients, grid, n_particle) for coefficients in self._error_models.values()],
+            axis=0,
+        )
+
+        return error if np.ndim(grid) or np.ndim(n_particle) else error.item()
+
+    def suggest(self, tolerance: float):
+        """
+        Returns the distgen and Impact settings predicted to run fastest with
+        relative errors within tolerance. Candidates are the swept and reference
+        grids with particle counts between the smallest swept count and the
+        reference count. Falls back to the reference configuration when no
+        candidate is predicted to meet tolerance.
+        """
+        grids = sorted({record["grid"] for record in self._records} | {self._reference["grid"]})
+        n_particles = np.unique(
+            np.round(np.geomspace(min(record["n_particle"] for record in self._records), self._reference["n_particle"], 25), -2)
+        )
+
+        grid, n_particle = np.meshgrid(np.array(grids, dtype=float), n_particles)
+        grid, n_particle = grid.ravel(), n_particle.ravel()
+
+        feasible = self.predict_error(grid, n_particle) <= tolerance
+        if not feasible.any():
+            logger.warning(f"No calibrated configuration is predicted within {tolerance}, using the reference")
+            return _settings(self._reference["grid"], self._reference["n_particle"])
+
+        run_time = np.where(feasible, self.predict_run_time(grid, n_particle), np.inf)
+        best = np.argmin(run_time)
+
+        return _settings(grid[best], n_particle[best])
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"records": self._records, "reference": self._reference}, f, indent=2)
+
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "r") as f:
+            data = json.load(f)
+
+        return cls(data["records"], data["reference"])
+
+
+def calibrate(
+    distgen_configuration: dict,
+    impact_configuration: dict,
+    distgen_settings: dict = None,
+    impact_settings: dict = None,
+    distgen_inputs: dict = None,
+    impact_inputs: dict = None,
+    grids=CALIBRATION_GRIDS,
+    n_particles=CALIBRATION_N_PARTICLES,
+    reference_grid: int = REFERENCE_GRID,
+    reference_n_particle: int = REFERENCE_N_PARTICLE,
+):
+    """
+    Runs distgen and Impact on the lattice in archive.h5 for each grid and
+    particle count and for the reference, and returns the fitted Calibration.
+
+    distgen_inputs and impact_inputs are prepared input values, in Impact units,
+    unspecified Impact inputs keep their archived values
+    """
+    workdir = impact_configuration.get("workdir") or tempfile.gettempdir()
+
+    distgen_model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(**distgen_configuration),
+        base_settings=distgen_settings,
+        distgen_output_filename=os.path.join(workdir, "laser.txt"),
+    )
+    distgen_input_variables = _input_variables(DISTGEN_INPUT_VARIABLES, {**CALIBRATION_DISTGEN_INPUTS, **(distgen_inputs or {})})
+
+    impact_input_variables = [
+        variable for var_name, variable in _input_variables(IMPACT_INPUT_VARIABLES, impact_inputs or {}).items()
+        if var_name in (impact_inputs or {})
+    ]
+
+    def run(grid, n_particle):
+        t0 = time()
+        distgen_model.evaluate(distgen_input_variables, settings={"n_particle": n_particle})
+
+        impact_model = ImpactModel(
+            archive_file=IMPACT_ARCHIVE_FILE,
+            configuration=LUMEConfiguration(**impact_configuration),
+            base_settings=impact_settings,
+        )
+        output_variables = impact_model.evaluate(impact_input_variables, distgen_model.particles, settings=_settings(grid, n_particle)["impact"])
+        run_time = time() - t0
+
+        logger.info(f"Calibration run with grid {grid} and {n_particle} particles took {run_time:.1f} s")
+
+        return {
+            "grid": grid,
+            "n_particle": n_particle,
+            "run_time": run_time,
+            "outputs": {var_name: float(output_variables[var_name].value) for var_name in CALIBRATION_OUTPUTS},
+        }
+
+    reference = run(reference_grid, reference_n_particle)
+    records = [run(grid, n_particle) for grid in grids for n_particle in n_particles]
+
+    return Calibration(records, reference)
+
+
+@click.command()
+@click.argument("output")
+@click.option("--workdir", default=None, help="Directory for distgen and Impact runs. Defaults to the system temporary directory.")
+@click.option("--command", default="ImpactTexe", show_default=True, help="Impact-T executable.")
+@click.option("--tolerance", default=0.05, show_default=True, help="Relative error tolerance of the printed suggestion.")
+def main(output, workdir, command, tolerance):
+    """
+    Calibrate the space-charge grid and particle count against a reference run
+    and write the calibration for the flow's calibration_file parameter to OUTPUT
+    """
+    calibration = calibrate(
+        distgen_configuration={},
+        impact_configuration={"command": command, "workdir": workdir},
+        distgen_settings={"t_dist:length:value": 4 * 1.65},
+        impact_settings={"stop": 16.5, "numprocs": 1, "timeout": 10000},
+    )
+    calibration.save(output)
+
+    print(json.dumps(calibration.suggest(tolerance)))
+
+
+if __name__ == "__main__":
+    main()
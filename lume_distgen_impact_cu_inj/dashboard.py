@@ -1,55 +1,96 @@
+import io
 import os
 import json
+import logging
+import multiprocessing
 import numpy as np
+from time import time
 
 from pathlib import Path
 import matplotlib.pyplot as plt
 plt.style.use('dark_background')
 import matplotlib as mpl
 mpl.use('Agg')
+from matplotlib.gridspec import GridSpec
+import click
 
-from PIL import Image, ImageOps, ImageEnhance 
+from pmd_beamphysics.units import nice_array, nice_scale_prefix
+
+from PIL import Image, ImageStat
+
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
 
 
 
 def fig2data(fig):
     """
-    @brief Convert a Matplotlib figure to a 4D numpy array with RGBA channels and return it
+    @brief Convert a Matplotlib figure to a 3D numpy array with RGBA channels and return it
     @param fig a matplotlib figure
-    @return a numpy 3D array of RGBA values
+    @return a numpy 3D array of RGBA values with shape (height, width, 4), a view
+        of the Agg renderer buffer that is valid until the figure is drawn again
     """
     # draw the renderer
     fig.canvas.draw()
-    # Get the RGBA buffer from the figure
-    w,h = fig.canvas.get_width_height()
-    buf = np.frombuffer ( fig.canvas.tostring_argb(), dtype=np.uint8 )
-    buf.shape = ( w, h, 4 )
-    # canvas.tostring_argb give pixmap in ARGB mode. Roll the ALPHA channel to have it in RGBA mode
-    buf = np.roll ( buf, 3, axis = 2 )
-    return buf
+    # Agg renders RGBA, so the buffer can be used without conversion or copies
+    return np.asarray(fig.canvas.buffer_rgba())
 
-def fig2img ( fig ):
+def fig2array ( fig, close=True ):
+    """
+    @brief Render a Matplotlib figure to a numpy RGBA array and return it
+    @param fig a matplotlib figure
+    @param close close the figure once rendered, so it is released by pyplot
+    @return a numpy 3D array of RGBA values sharing the renderer buffer, which
+        the array keeps alive after the figure is closed
+    """
+    try:
+        return fig2data ( fig )
+    finally:
+        if close:
+            plt.close(fig)
+
+def fig2img ( fig, close=True ):
     """
     @brief Convert a Matplotlib figure to a PIL Image in RGBA format and return it
     @param fig a matplotlib figure
+    @param close close the figure once rendered, so it is released by pyplot
     @return a Python Imaging Library ( PIL ) image
     """
     # put the figure pixmap into a numpy array
-    buf = fig2data ( fig )
-    w, h, d = buf.shape
-    return Image.frombytes( "RGBA", ( w ,h ), buf.tobytes( ) )
+    buf = fig2array ( fig, close=close )
+    h, w, d = buf.shape
+    # shares the renderer buffer
+    return Image.frombuffer( "RGBA", ( w ,h ), buf, "raw", "RGBA", 0, 1 )
+
+
+
+SCREEN_METHODS = ["histogram", "scatter"]
+
+
+def iscreen(impact_object, screen='OTR2', k1='x', k2='y', dpi=72, title=None, as_array=False, method='histogram', bins=None):
+    """
+    Screen panel. method="histogram" bins the particles once and shows the
+    binned image, so plotting does not scale with the number of particles.
+    method="scatter" uses ParticleGroup.plot on all particles.
+    """
+    if method not in SCREEN_METHODS:
+        raise ValueError(f"method must be one of {SCREEN_METHODS}, got {method}")
 
+    particles = impact_object.particles[screen]
 
+    # stored dashboard data is already binned
+    if method == 'histogram' and not isinstance(particles, _ScreenHistograms):
+        fig = ScreenHistogram.from_particles(particles, k1, k2, bins=bins).plot(figsize=(5,4))
+    else:
+        fig = particles.plot(k1, k2, return_figure=True, figsize=(5,4))
 
-def iscreen(impact_object, screen='OTR2', k1='x', k2='y', dpi=72, title=None):
-    fig = impact_object.particles[screen].plot(k1, k2, return_figure=True, figsize=(5,4))
     fig.dpi=dpi
     
     if not title:
         title = screen
     fig.axes[2].set_title(title)
     fig.tight_layout()
-    return fig2img(fig)
+    return fig2array(fig) if as_array else fig2img(fig)
 
 
 
@@ -83,35 +124,20 @@ Run time: {run_time/60:.1f} min
 """
     return summary
 
-def itext(impact_object, dpi=72, name=''):
+def itext(impact_object, dpi=72, name='', as_array=False):
     text = info_str(impact_object, name=name)
     fig, ax = plt.subplots(figsize=(5,4))
     fig.dpi=dpi
     fig.tight_layout()
     ax.set_axis_off()
     ax.text(0.1, 0.5, text, fontsize=13, horizontalalignment='left', verticalalignment='center', transform=ax.transAxes)
-    return fig2img(fig)
+    return fig2array(fig) if as_array else fig2img(fig)
 
 
 
-def make_dashboard(impact_object=None,
-                   dat=None,
-                   itime=None,
-                   screen1='YAG02',
-                   screen2='YAG03',
-                   screen3='OTR2',
-                   ylim=(0,2e-6),
-                   ylim2=(0,2e-3),
-                   name='lume-impact-live-demo'
-                  ):
-    """
-    Makes a composite dashboard image from data dict
-    
-    Returns the path to the figure written
-    """
-    I = impact_object   
+def imain(impact_object, itime=None, ylim=(0,2e-6), ylim2=(0,2e-3), dpi=150, as_array=False):
+    I = impact_object
 
-    
     run_time = I.output['run_info']['run_time'] 
     # Main figure
     FIG0 = I.plot(['norm_emit_x','norm_emit_y'], 
@@ -126,49 +152,548 @@ def make_dashboard(impact_object=None,
     FIG0.tight_layout()
     FIG0.axes[0].set_title(title)
     
-    DPI = 150 # test
-    FIG0.dpi=DPI
-    im0 = fig2img(FIG0)
-    
-    
+    FIG0.dpi=dpi
+    return fig2array(FIG0) if as_array else fig2img(FIG0)
+
+
+# Impact object shared by dashboard worker processes, set by _init_panel_worker
+_PANEL_WORKER = {}
+
+
+def _init_panel_worker(impact_object):
+    _PANEL_WORKER["impact_object"] = impact_object
+
+
+def _render_panel(impact_object, render, kwargs):
+    t0 = time()
+    image = render(impact_object, **kwargs)
+    return image, time() - t0
+
+
+def _render_worker_panel(render, kwargs):
+    return _render_panel(_PANEL_WORKER["impact_object"], render, kwargs)
+
+
+def render_panels(impact_object, panels, max_workers=1, timeout=None):
+    """
+    Renders panels, a dict of name: (render function, kwargs), in this process
+    by default. max_workers > 1 renders in a pool of that many processes, or
+    one per panel up to the CPU count for None, each receiving the impact
+    object once. Processes are not started from daemonic processes such as
+    Dask workers, which render in process instead. If pooled rendering does
+    not finish within timeout seconds, the workers are terminated and a
+    TimeoutError is raised.
+
+    Returns dicts of name: image and name: render time in seconds
+    """
+    if max_workers != 1 and multiprocessing.current_process().daemon:
+        logger.warning("Rendering dashboard panels in process, daemonic processes cannot start workers")
+        max_workers = 1
+
+    if max_workers == 1:
+        results = {
+            name: _render_panel(impact_object, render, kwargs)
+            for name, (render, kwargs) in panels.items()
+        }
+
+    else:
+        if max_workers is None:
+            max_workers = min(len(panels), os.cpu_count() or 1)
+
+        deadline = None if timeout is None else time() + timeout
+
+        pool = multiprocessing.Pool(max_workers, initializer=_init_panel_worker, initargs=(impact_object,))
+        try:
+            pending = {
+                name: pool.apply_async(_render_worker_panel, (render, kwargs))
+                for name, (render, kwargs) in panels.items()
+            }
+
+            results = {}
+            for name, result in pending.items():
+                remaining = None if deadline is None else max(deadline - time(), 0)
+                try:
+                    results[name] = result.get(remaining)
+                except multiprocessing.TimeoutError:
+                    raise TimeoutError(f"Dashboard rendering exceeded {timeout} s at panel {name}")
+
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    images = {name: image for name, (image, _) in results.items()}
+    timings = {name: render_time for name, (_, render_time) in results.items()}
+
+    return images, timings
+
+
+def _paste(canvas, panel, x, y):
+    # clip to the canvas as PIL's paste does
+    h = min(panel.shape[0], canvas.shape[0] - y)
+    w = min(panel.shape[1], canvas.shape[1] - x)
+    canvas[y:y+h, x:x+w] = panel[:h, :w]
+
+
+# rows of the canvas mapped per lookup, bounding the temporary to a few hundred KB
+_CONTRAST_ROWS = 64
+
+
+def enhance_contrast(canvas, factor):
+    """
+    Same adjustment as PIL's ImageEnhance.Contrast, applied in place to an RGBX
+    uint8 canvas as a lookup table pass. Pairs of channels are mapped at once
+    through a 16 bit table, which also maps the unused X channel.
+    """
+    image = Image.frombuffer("RGBX", (canvas.shape[1], canvas.shape[0]), canvas, "raw", "RGBX", 0, 1)
+    mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+
+    # blend with the mean, truncated as in PIL
+    values = np.arange(256, dtype=np.float32)
+    lut = np.clip(np.float32(mean) + np.float32(factor) * (values - np.float32(mean)), 0, 255).astype(np.uint16)
+
+    pairs = np.arange(65536)
+    lut16 = lut[pairs & 0xff] | (lut[pairs >> 8] << 8)
+
+    channel_pairs = canvas.view(np.uint16)
+    for row in range(0, len(channel_pairs), _CONTRAST_ROWS):
+        rows = channel_pairs[row:row + _CONTRAST_ROWS]
+        rows[...] = lut16[rows]
+
+    return canvas
+
+
+def composite_dashboard(panels, contrast=1.2):
+    """
+    Composites the dashboard panels, a dict of name: RGBA array, into a single
+    RGB image with its contrast enhanced
+
+    Panels are copied straight into one preallocated canvas, whose contrast is
+    enhanced in place before a single conversion to an RGB image.
+    """
+    h0, w0 = panels["main"].shape[:2]
+    h1, w1 = panels["screen1"].shape[:2]
+    h2 = panels["screen2"].shape[0]
+    h3 = panels["text"].shape[0]
+    h4 = panels["screen3_z"].shape[0]
+    w99 = panels["cathode"].shape[1]
+
+    # PIL stores RGB as RGBX, so the panel alpha lands in the unused channel
+    canvas = np.zeros((h1 + h2 + h3, w0 + w1, 4), dtype=np.uint8)
+
+    # later panels overwrite earlier ones where they overlap
+    layout = [
+        ("main", 0, 10),
+        ("cathode", 0, h0),
+        ("screen1", w99, h0),
+        ("screen2", w99 + w1, h0),
+        ("text", w0, 0),
+        ("screen3_z", w0, h3),
+        ("screen3", w0, h4 + h3),
+    ]
+
+    for name, x, y in layout:
+        _paste(canvas, panels[name], x, y)
+
+    enhance_contrast(canvas, contrast)
+
+    return Image.frombuffer("RGBX", (canvas.shape[1], canvas.shape[0]), canvas, "raw", "RGBX", 0, 1).convert("RGB")
+
+
+def encode_png(image, compress_level=6):
+    """
+    Returns image encoded as PNG bytes with compress_level (0-9), lower trades
+    file size for encoding time
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def dashboard_screens(impact_object, screen1='YAG02', screen2='YAG03', screen3='OTR2'):
     # For short debugging runs
-    if screen1 not in I.particles:
+    if screen1 not in impact_object.particles:
         screen1='initial_particles'
         screen2='initial_particles'
         screen3='final_particles'
 
-        
-    # info text
-    #imtext = ImageOps.invert(itext(I, dpi=DPI).convert('RGB'))     
-    imtext =itext(I, dpi=DPI, name=name)
-
-    im1 = iscreen(I, screen=screen1, k1='x', k2='y', dpi=DPI)
-    im2 = iscreen(I, screen=screen2, k1='x', k2='y', dpi=DPI)
-    #im3 = iscreen(I, screen=screen3, k1='x', k2='y', dpi=DPI)
-    im3 = imtext
-    im4 = iscreen(I, screen=screen3, k1='delta_z', k2='delta_energy', dpi=DPI)
-    im5 = iscreen(I, screen=screen3, k1='x', k2='y', dpi=DPI)
-    
-    im99 = iscreen(I, screen='initial_particles', k1='x', k2='y', dpi=DPI, title='cathode')
-    
-    SIZE =  (im0.width + im1.width, im1.height+im2.height+im3.height)
-    ii = Image.new('RGB', SIZE)
-    
-    invim0 = ImageOps.invert(im0.convert('RGB'))
-    ii.paste(im0, (0, 10))
-    
-    ii.paste(im99, (0, im0.height))
-    ii.paste(im1, (im99.width, im0.height))
-    ii.paste(im2, (im99.width+im1.width,im0.height))
-    ii.paste(im3, (im0.width,0))
-    ii.paste(im4, (im0.width,im3.height))
-    ii.paste(im5, (im0.width,im4.height+im3.height))
+    return screen1, screen2, screen3
+
+
+def make_dashboard(impact_object=None,
+                   dat=None,
+                   itime=None,
+                   screen1='YAG02',
+                   screen2='YAG03',
+                   screen3='OTR2',
+                   ylim=(0,2e-6),
+                   ylim2=(0,2e-3),
+                   name='lume-impact-live-demo',
+                   max_workers=1,
+                   timeout=None,
+                   screen_method='histogram',
+                  ):
+    """
+    Makes a composite dashboard image from data dict
+
+    Panels are rendered in this process, or in max_workers processes, see render_panels.
+    screen_method selects the iscreen renderer.
     
+    Returns the path to the figure written
+    """
+    I = impact_object   
+
+    t0 = time()
+
+    DPI = 150 # test
     
-    # Enhance contrast
-    #enhancer = ImageEnhance.Brightness(ii) 
-    enhancer = ImageEnhance.Contrast(ii) 
-    iout = enhancer.enhance(1.2)
+    screen1, screen2, screen3 = dashboard_screens(I, screen1, screen2, screen3)
+
+    panels = {
+        "main": (imain, dict(itime=itime, ylim=ylim, ylim2=ylim2, dpi=DPI, as_array=True)),
+        # info text
+        "text": (itext, dict(dpi=DPI, name=name, as_array=True)),
+        "screen1": (iscreen, dict(screen=screen1, k1='x', k2='y', dpi=DPI, method=screen_method, as_array=True)),
+        "screen2": (iscreen, dict(screen=screen2, k1='x', k2='y', dpi=DPI, method=screen_method, as_array=True)),
+        "screen3_z": (iscreen, dict(screen=screen3, k1='delta_z', k2='delta_energy', dpi=DPI, method=screen_method, as_array=True)),
+        "screen3": (iscreen, dict(screen=screen3, k1='x', k2='y', dpi=DPI, method=screen_method, as_array=True)),
+        "cathode": (iscreen, dict(screen='initial_particles', k1='x', k2='y', dpi=DPI, title='cathode', method=screen_method, as_array=True)),
+    }
+
+    images, timings = render_panels(I, panels, max_workers=max_workers, timeout=timeout)
+
+    for panel, render_time in timings.items():
+        logger.info(f"Rendered dashboard panel {panel} in {render_time:.2f} s")
+
+    # composite in a fixed layout independent of render order
+    iout = composite_dashboard(images, contrast=1.2)
+
+    logger.info(f"Created dashboard in {time() - t0:.2f} s")
     
     return iout
-    
\ No newline at end of file
+
+
+
+# maximum bins per axis for stored screen histograms
+SCREEN_BINS = 100
+
+# stats read by the main panel
+DASHBOARD_STAT_KEYS = ['mean_z', 'norm_emit_x', 'norm_emit_y', 'sigma_x', 'sigma_y', 'sigma_z']
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {key: _jsonable(val) for key, val in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _bin_index(x, edges):
+    # uniform bins computed directly, then corrected against the edges for
+    # rounding as np.histogram does, so counts match np.histogram2d
+    bins = len(edges) - 1
+    first, last = edges[0], edges[-1]
+
+    index = ((x - first) * (bins / (last - first))).astype(np.intp)
+    np.clip(index, 0, bins - 1, out=index)
+
+    index[x < edges[index]] -= 1
+    index[(x >= edges[index + 1]) & (index != bins - 1)] += 1
+
+    return index
+
+
+def _edges(x, bins):
+    first, last = float(x.min()), float(x.max())
+    if first == last:
+        first, last = first - 0.5, last + 0.5
+    return np.linspace(first, last, bins + 1)
+
+
+def histogram2d(x, y, bins=10, weights=None):
+    """
+    np.histogram2d over the full range of x and y with uniform bins, using a
+    single bincount pass instead of a sorted search per axis
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    xedges = _edges(x, bins)
+    yedges = _edges(y, bins)
+
+    index = _bin_index(x, xedges) * bins
+    index += _bin_index(y, yedges)
+
+    hist = np.bincount(index, weights=weights, minlength=bins * bins).reshape(bins, bins)
+
+    return hist.astype(float, copy=False), xedges, yedges
+
+
+def _unit_symbol(unit):
+    return getattr(unit, 'unitSymbol', str(unit))
+
+
+class ScreenHistogram:
+    """
+    Weighted 2D histogram of a screen's particles in k1, k2, with the edges and
+    units needed to plot it as marginal_plot would
+    """
+
+    def __init__(self, k1, k2, hist, xedges, yedges, units1='', units2=''):
+        self.k1 = k1
+        self.k2 = k2
+        self.hist = hist
+        self.xedges = xedges
+        self.yedges = yedges
+        self.units1 = units1
+        self.units2 = units2
+
+    @classmethod
+    def from_particles(cls, particle_group, k1, k2, bins=None):
+        if not bins:
+            # marginal_plot heuristic, capped so the histogram stays compact
+            bins = min(max(int(np.sqrt(len(particle_group) / 4)), 1), SCREEN_BINS)
+
+        hist, xedges, yedges = histogram2d(
+            particle_group[k1], particle_group[k2], bins=bins, weights=particle_group['weight']
+        )
+
+        return cls(
+            k1, k2, hist, xedges, yedges,
+            _unit_symbol(particle_group.units(k1)), _unit_symbol(particle_group.units(k2)),
+        )
+
+    def plot(self, figsize=None, **kwargs):
+        fig = plt.figure(figsize=figsize, **kwargs)
+
+        gs = GridSpec(4, 4)
+        ax_joint = fig.add_subplot(gs[1:4, 0:3])
+        ax_marg_x = fig.add_subplot(gs[0, 0:3])
+        ax_marg_y = fig.add_subplot(gs[1:4, 3])
+
+        f1, prefix1 = nice_scale_prefix(np.abs(self.xedges).max())
+        f2, prefix2 = nice_scale_prefix(np.abs(self.yedges).max())
+        xedges = self.xedges / f1
+        yedges = self.yedges / f2
+
+        # empty bins show the background, as with hexbin
+        ax_joint.imshow(
+            np.ma.masked_equal(self.hist.T, 0),
+            origin='lower',
+            extent=[xedges[0], xedges[-1], yedges[0], yedges[-1]],
+            aspect='auto',
+            interpolation='nearest',
+        )
+
+        # projections as charge densities
+        width = np.diff(self.xedges)
+        density, _, density_prefix = nice_array(self.hist.sum(axis=1) / width)
+        ax_marg_x.bar(xedges[:-1] + np.diff(xedges) / 2, density, np.diff(xedges), color='gray')
+        ax_marg_x.set_ylabel(f'{density_prefix}C/{self.units1}')
+
+        width = np.diff(self.yedges)
+        density, _, density_prefix = nice_array(self.hist.sum(axis=0) / width)
+        ax_marg_y.barh(yedges[:-1] + np.diff(yedges) / 2, density, np.diff(yedges), color='gray')
+        ax_marg_y.set_xlabel(f'{density_prefix}C/{self.units2}')
+
+        plt.setp(ax_marg_x.get_xticklabels(), visible=False)
+        plt.setp(ax_marg_y.get_yticklabels(), visible=False)
+
+        ax_joint.set_xlabel(f'{self.k1} ({prefix1}{self.units1})')
+        ax_joint.set_ylabel(f'{self.k2} ({prefix2}{self.units2})')
+        ax_joint.set_xlim(xedges[0], xedges[-1])
+        ax_joint.set_ylim(yedges[0], yedges[-1])
+        ax_marg_x.set_xlim(xedges[0], xedges[-1])
+        ax_marg_y.set_ylim(yedges[0], yedges[-1])
+
+        return fig
+
+
+class _ScreenHistograms(dict):
+    # (k1, k2): ScreenHistogram, plotted with the ParticleGroup.plot call iscreen makes
+
+    def plot(self, k1, k2, return_figure=True, figsize=None, **kwargs):
+        return self[(k1, k2)].plot(figsize=figsize, **kwargs)
+
+
+class DashboardData:
+    """
+    Compact record of what the dashboard reads from a finished Impact run: run
+    info, stats arrays and binned screen particles. It provides the parts of the
+    Impact interface used by imain, itext and iscreen, so make_dashboard renders
+    it in place of the Impact object. The main panel is drawn without the
+    lattice layout.
+    """
+
+    def __init__(self, info, stats, screens):
+        self.info = info
+        self.stats = stats
+        self.particles = {}
+        for (screen, k1, k2), histogram in screens.items():
+            self.particles.setdefault(screen, _ScreenHistograms())[(k1, k2)] = histogram
+
+    @property
+    def header(self):
+        return self.info['header']
+
+    @property
+    def ele(self):
+        return self.info['ele']
+
+    @property
+    def output(self):
+        return self.info['output']
+
+    @property
+    def itime(self):
+        return self.info.get('itime')
+
+    @property
+    def name(self):
+        return self.info.get('name', '')
+
+    def __getitem__(self, key):
+        return self.info['attrs'][key]
+
+    def stat(self, key):
+        return self.stats[key]
+
+    def units(self, key):
+        return self.info['units'][key]
+
+    def plot(self, y=('sigma_x', 'sigma_y'), x='mean_z', ylim=None, ylim2=None, y2=(), figsize=None, return_figure=True, **kwargs):
+        fig, ax = plt.subplots(figsize=figsize, **kwargs)
+
+        fx, prefix_x = nice_scale_prefix(np.abs(self.stat(x)).max())
+        xdata = self.stat(x) / fx
+
+        axes = [(ax, list(y), ylim)]
+        if y2:
+            axes.append((ax.twinx(), list(y2), ylim2))
+
+        for i, (axis, keys, lim) in enumerate(axes):
+            scale = max(np.abs(self.stat(key)).max() for key in keys) if lim is None else max(np.abs(lim))
+            f, prefix = nice_scale_prefix(scale)
+            linestyle = '-' if i == 0 else '--'
+            for key in keys:
+                axis.plot(xdata, self.stat(key) / f, linestyle=linestyle, label=key)
+            axis.set_ylabel(', '.join(keys) + f' ({prefix}{self.units(keys[0])})')
+            if lim is not None:
+                axis.set_ylim(lim[0] / f, lim[1] / f)
+            axis.legend(loc='upper left' if i == 0 else 'upper right')
+
+        ax.set_xlabel(f'{x} ({prefix_x}{self.units(x)})')
+        ax.set_xlim(xdata.min(), xdata.max())
+
+        return fig
+
+    @classmethod
+    def from_impact(cls, impact_object, itime=None, name='', screen1='YAG02', screen2='YAG03', screen3='OTR2', bins=None):
+        I = impact_object
+        H = I.header
+        screen1, screen2, screen3 = dashboard_screens(I, screen1, screen2, screen3)
+
+        info = {
+            'header': {key: H[key] for key in ['Np', 'Nbunch', 'Nprow', 'Npcol', 'Nx', 'Ny', 'Nz', 'Dt']},
+            'ele': {'change_timestep_1': {key: I.ele['change_timestep_1'][key] for key in ['dt', 's']}},
+            'output': {'run_info': {'run_time': I.output['run_info']['run_time']}},
+            'attrs': {key: I[key] for key in ['species', 'total_charge']},
+            'units': {key: _unit_symbol(I.units(key)) for key in DASHBOARD_STAT_KEYS},
+            'itime': None if itime is None else str(itime),
+            'name': name,
+        }
+
+        stats = {key: np.asarray(I.stat(key)) for key in DASHBOARD_STAT_KEYS}
+
+        screens = {}
+        for screen, k1, k2 in [
+            (screen1, 'x', 'y'),
+            (screen2, 'x', 'y'),
+            (screen3, 'delta_z', 'delta_energy'),
+            (screen3, 'x', 'y'),
+            ('initial_particles', 'x', 'y'),
+        ]:
+            if (screen, k1, k2) not in screens:
+                screens[(screen, k1, k2)] = ScreenHistogram.from_particles(I.particles[screen], k1, k2, bins=bins)
+
+        return cls(_jsonable(info), stats, screens)
+
+    def save(self, filename):
+        arrays = {'info': np.array(json.dumps(self.info))}
+        arrays.update({f'stats:{key}': value for key, value in self.stats.items()})
+
+        screens = []
+        for screen, histograms in self.particles.items():
+            for histogram in histograms.values():
+                i = len(screens)
+                screens.append([screen, histogram.k1, histogram.k2, histogram.units1, histogram.units2])
+                arrays[f'screen:{i}:hist'] = histogram.hist
+                arrays[f'screen:{i}:xedges'] = histogram.xedges
+                arrays[f'screen:{i}:yedges'] = histogram.yedges
+
+        arrays['screens'] = np.array(json.dumps(screens))
+
+        with open(filename, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            info = json.loads(data['info'].item())
+            stats = {key.split(':', 1)[1]: data[key] for key in data.files if key.startswith('stats:')}
+            screens = {
+                (screen, k1, k2): ScreenHistogram(
+                    k1, k2, data[f'screen:{i}:hist'], data[f'screen:{i}:xedges'], data[f'screen:{i}:yedges'], units1, units2
+                )
+                for i, (screen, k1, k2, units1, units2) in enumerate(json.loads(data['screens'].item()))
+            }
+
+        return cls(info, stats, screens)
+
+
+def dashboard_data_filename(archive_file):
+    """
+    Deferred dashboard data is stored next to the run archive
+    """
+    return f"{os.path.splitext(archive_file)[0]}.dashboard.npz"
+
+
+def render_dashboard(archive_file, filename=None, compress_level=6, **kwargs):
+    """
+    Renders the dashboard of a deferred run from the data stored next to its
+    archive file, as recorded in the run's ImpactResult. The PNG is encoded
+    with compress_level, kwargs are passed to make_dashboard.
+
+    Returns the path to the figure written, by default next to the archive
+    """
+    data = DashboardData.load(dashboard_data_filename(archive_file))
+
+    if filename is None:
+        filename = f"{os.path.splitext(archive_file)[0]}.png"
+
+    kwargs.setdefault('itime', data.itime)
+    kwargs.setdefault('name', data.name)
+
+    png = encode_png(make_dashboard(data, **kwargs), compress_level=compress_level)
+    with open(filename, "wb") as f:
+        f.write(png)
+
+    return filename
+
+
+@click.command()
+@click.argument("archive_file")
+@click.option("--output", default=None, help="PNG path. Defaults to the archive path with a .png suffix.")
+@click.option("--max-workers", default=1, show_default=True, type=int, help="Panel render processes, 1 renders in process.")
+@click.option("--compress-level", default=6, show_default=True, type=click.IntRange(0, 9), help="PNG compression, lower trades file size for encoding time.")
+def main(archive_file, output, max_workers, compress_level):
+    """
+    Render the dashboard of a run flowed with dashboard_mode="deferred"
+    """
+    print(render_dashboard(archive_file, filename=output, max_workers=max_workers, compress_level=compress_level))
+
+
+if __name__ == "__main__":
+    main()
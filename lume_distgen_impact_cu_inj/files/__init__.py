@@ -1,29 +1,19 @@
-from pkg_resources import resource_filename
-from lume_model.utils import variables_from_yaml
-import pandas as pd
+import os
 
-IMPACT_VARIABLE_FILE =resource_filename(
-    "lume_distgen_impact_cu_inj.files", "variables.yml"
-)
+# package data is installed alongside this module, resolving paths directly
+# avoids importing pkg_resources
+_FILES_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DISTGEN_VARIABLE_FILE =resource_filename(
-    "lume_distgen_impact_cu_inj.files", "distgen_variables.yml"
-)
+IMPACT_VARIABLE_FILE = os.path.join(_FILES_DIR, "variables.yml")
 
-DEFAULT_VCC_ARRAY_FILE =resource_filename(
-    "lume_distgen_impact_cu_inj.files", "default_vcc_array.npy"
-)
+DISTGEN_VARIABLE_FILE = os.path.join(_FILES_DIR, "distgen_variables.yml")
 
+DEFAULT_VCC_ARRAY_FILE = os.path.join(_FILES_DIR, "default_vcc_array.npy")
 
-DISTGEN_INPUT_FILE = resource_filename(
-    "lume_distgen_impact_cu_inj.files", "distgen.yml"
-)
 
-IMPACT_ARCHIVE_FILE =  resource_filename(
-    "lume_distgen_impact_cu_inj.files", "archive.h5"
-)
+DISTGEN_INPUT_FILE = os.path.join(_FILES_DIR, "distgen.yml")
 
+IMPACT_ARCHIVE_FILE = os.path.join(_FILES_DIR, "archive.h5")
 
-CU_INJ_MAPPING = resource_filename(
-    "lume_distgen_impact_cu_inj.files", "cu_inj_impact.csv"
-)
+
+CU_INJ_MAPPING = os.path.join(_FILES_DIR, "cu_inj_impact.csv")
@@ -1,8 +1,14 @@
 from typing import Dict
 
+import prefect
 from prefect import Flow, task, case
+from prefect.tasks.control_flow import merge
 from prefect import Parameter
 import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
 import numpy as np
 from lume_services.results import ImpactResult
 from lume_services.tasks import (
@@ -14,36 +20,75 @@ from lume_services.tasks import (
     LoadFile,
     SaveFile,
 )
-from lume_services.files import HDF5File, ImageFile, TextFile
+from lume_services.files import File, HDF5File, TextFile
+from lume.serializers.base import SerializerBase
+from pydantic import Field
+from PIL import Image
 from lume_model.variables import InputVariable, OutputVariable
 from prefect.storage import Module
 from prefect.core.parameter import DateTimeParameter
-from lume_distgen_impact_cu_inj.model import ImpactModel, DistgenModel, LUMEConfiguration
-from lume_distgen_impact_cu_inj.dashboard import make_dashboard
+from lume_distgen_impact_cu_inj.model import ImpactModel, DistgenModel, LUMEConfiguration, ExecutionPlanner, IMPACT_POOL
+from lume_distgen_impact_cu_inj.surrogate import SurrogateImpactModel
+from lume_distgen_impact_cu_inj.calibration import Calibration
+from lume_distgen_impact_cu_inj.dashboard import make_dashboard, encode_png, DashboardData, dashboard_data_filename
+from lume_distgen_impact_cu_inj.cache import ResultCache, ParticleCache, canonical_hash
+from lume_distgen_impact_cu_inj.utils import load_vcc_array, save_particles, ParticleFile
 
 from lume_distgen_impact_cu_inj.files import IMPACT_ARCHIVE_FILE, DISTGEN_INPUT_FILE
 
 from lume_distgen_impact_cu_inj import (
-    CU_INJ_MAPPING_TABLE,
+    IMPACT_FACTORS,
+    IMPACT_INPUT_FACTORS,
     IMPACT_INPUT_VARIABLES,
     DISTGEN_INPUT_VARIABLES
 )
 
 PREFECT__CONTEXT__FLOW_ID = os.environ.get("PREFECT__CONTEXT__FLOW_ID", "local")
 
+PARTICLE_HANDOFFS = ["memory", "file"]
+
+# DistgenModels kept across flow runs in this process, so that reuse_generator
+# keeps its Generator between runs. Keyed on everything the model is built from,
+# least-recently-used models are dropped beyond DISTGEN_MODEL_POOL_SIZE.
+DISTGEN_MODEL_POOL_SIZE = 4
+_distgen_models = OrderedDict()
+_distgen_models_lock = threading.Lock()
+
+
+def _pooled_distgen_model(key, build):
+    """
+    Returns the pooled model for key, built by build() if missing, and the lock
+    serializing its evaluations
+    """
+    with _distgen_models_lock:
+        entry = _distgen_models.pop(key, None)
+        if entry is None:
+            entry = (build(), threading.Lock())
+
+        _distgen_models[key] = entry
+        while len(_distgen_models) > DISTGEN_MODEL_POOL_SIZE:
+            _distgen_models.popitem(last=False)
+
+    return entry
+
 
 @task(log_stdout=True)
-def distgen_preprocessing_task(input_variables):
+def distgen_preprocessing_task(input_variables, vcc_array_file=None):
 
     # scale all values w.r.t. impact factor
     for var_name, variable in input_variables.items():
 
         # downcast
         if var_name == "vcc_array":
-            value = np.array(variable.value)
-            value = value.astype(np.int8)
+            # file transport takes precedence over the JSON list parameter
+            if vcc_array_file is not None:
+                value = load_vcc_array(vcc_array_file)
+            else:
+                value = np.array(variable.value)
 
-            if value.ptp() == 0:
+            value = value.astype(np.int8, copy=False)
+
+            if np.ptp(value) == 0:
                 raise ValueError(f"EPICS get for vcc_array has zero extent")
 
             variable.value = value
@@ -54,13 +99,7 @@ def distgen_preprocessing_task(input_variables):
                 variable.value = "um"
 
         if var_name == "total_charge":
-            scaled_val = (
-                variable.value
-                * CU_INJ_MAPPING_TABLE.loc[
-                    CU_INJ_MAPPING_TABLE["impact_name"] == "distgen:total_charge:value", "impact_factor"
-                ].item()
-            )
-            variable.value = scaled_val
+            variable.value = variable.value * IMPACT_FACTORS["distgen:total_charge:value"]
 
     return input_variables
 
@@ -68,22 +107,12 @@ def distgen_preprocessing_task(input_variables):
 @task(log_stdout=True)
 def impact_preprocessing_task(input_variables):
 
-    # scale all values w.r.t. impact factor
-    for var_name, variable in input_variables.items():
+    # scale all values w.r.t. impact factor in one pass over the precomputed factors
+    values = np.array([input_variables[var_name].value for var_name in IMPACT_INPUT_VARIABLES], dtype=float)
+    scaled_values = values * IMPACT_INPUT_FACTORS
 
-        if (
-            CU_INJ_MAPPING_TABLE["impact_name"]
-            .str.contains(var_name, regex=False)
-            .any()
-        ):
-            scaled_val = (
-                variable.value
-                * CU_INJ_MAPPING_TABLE.loc[
-                    CU_INJ_MAPPING_TABLE["impact_name"] == var_name, "impact_factor"
-                ].item()
-            )
-
-            variable.value = scaled_val
+    for var_name, scaled_val in zip(IMPACT_INPUT_VARIABLES, scaled_values.tolist()):
+        input_variables[var_name].value = scaled_val
 
     return input_variables
 
@@ -95,19 +124,66 @@ def evaluate_distgen(
     distgen_settings,
     distgen_output_filename,
     distgen_input_variables,
+    isolation_method="watershed",
+    particle_handoff="memory",
+    particle_dir=None,
+    particle_cache_dir=None,
+    particle_cache_size=16,
+    image_tolerance=None,
+    reuse_generator=True,
 ):
+    """
+    With reuse_generator, the DistgenModel and its Generator are kept across
+    runs in this process and only the image, charge and changed settings are
+    updated on later runs
+
+    The "file" particle handoff writes to particle_dir, which must be shared by
+    the workers running evaluate_impact. The file is removed once loaded.
+    """
+    if particle_handoff not in PARTICLE_HANDOFFS:
+        raise ValueError(f"particle_handoff must be one of {PARTICLE_HANDOFFS}, got {particle_handoff}")
+
+    if particle_handoff == "file" and particle_dir is None:
+        raise ValueError("particle_handoff 'file' requires particle_dir, a directory shared by the flow workers")
 
     configuration = LUMEConfiguration(**distgen_configuration)
-    distgen_model = DistgenModel(
-        input_file=DISTGEN_INPUT_FILE,
-        configuration=configuration,
-        base_settings=distgen_settings,
-        distgen_output_filename=distgen_input_filename,
-    )
 
-    output_variables = distgen_model.evaluate(distgen_input_variables)
+    def build():
+        return DistgenModel(
+            input_file=DISTGEN_INPUT_FILE,
+            configuration=configuration,
+            base_settings=distgen_settings,
+            distgen_output_filename=distgen_input_filename,
+            isolation_method=isolation_method,
+            reuse_generator=reuse_generator,
+            particle_cache=ParticleCache(particle_cache_dir, max_entries=particle_cache_size) if particle_cache_dir is not None else None,
+            image_tolerance=image_tolerance,
+        )
+
+    if reuse_generator:
+        key = canonical_hash(
+            distgen_configuration,
+            distgen_input_filename,
+            distgen_settings,
+            isolation_method,
+            particle_cache_dir,
+            particle_cache_size,
+            image_tolerance,
+        )
+        distgen_model, model_lock = _pooled_distgen_model(key, build)
+    else:
+        distgen_model, model_lock = build(), threading.Lock()
+
+    # hand off only the particles, later runs replace rather than modify them
+    with model_lock:
+        output_variables = distgen_model.evaluate(distgen_input_variables)
+        particles = distgen_model.particles
 
-    return (distgen_model.G, output_variables)
+    # pass a path and checksum, read by evaluate_impact
+    if particle_handoff == "file":
+        particles = save_particles(particles, particle_dir)
+
+    return (particles, output_variables)
 
 
 @task(log_stdout=True, nout=2)
@@ -116,48 +192,232 @@ def evaluate_impact(
     impact_configuration: dict,
     impact_settings: dict,
     input_variables,
-    distgen_model,
+    particles,
+    auto_numprocs=False,
+    scaling_file=None,
 ):
-    particles = distgen_model.particles
     impact_configuration = LUMEConfiguration(**impact_configuration)
 
+    planner = None
+    if auto_numprocs:
+        planner = ExecutionPlanner(
+            scaling_file or os.path.join(impact_configuration.workdir or tempfile.gettempdir(), "impact_scaling.jsonl")
+        )
+
     model = ImpactModel(
         archive_file=IMPACT_ARCHIVE_FILE,
         configuration=impact_configuration,
         base_settings=impact_settings,
+        planner=planner,
     )
-    output_variables = model.evaluate(list(input_variables.values()), particles)
+
+    # the handoff file is only read by this task
+    try:
+        output_variables = model.evaluate(list(input_variables.values()), particles)
+    finally:
+        if isinstance(particles, ParticleFile):
+            particles.remove()
 
     return (model.I, output_variables)
 
 
+@task(log_stdout=True)
+def evaluate_surrogate(surrogate_file, impact_input_variables, pv_collection_isotime, surrogate_dir=None):
+    # preview mode is off without a trained surrogate
+    if surrogate_file is None:
+        return None
+
+    # a preview never holds up the simulation downstream
+    try:
+        model = SurrogateImpactModel.load(surrogate_file)
+        output_variables = model.evaluate(list(impact_input_variables.values()))
+    except Exception as e:
+        prefect.context.get("logger").warning(f"Skipping surrogate preview, unable to evaluate {surrogate_file}: {e!r}")
+        return None
+
+    prediction = {
+        "pv_collection_isotime": str(pv_collection_isotime),
+        "inputs": {var_name: var.value for var_name, var in impact_input_variables.items()},
+        "outputs": {var_name: output_variables[var_name].value for var_name in model.output_names},
+        "uncertainty": model.uncertainty,
+    }
+
+    # available to clients while Impact is still running
+    if surrogate_dir is not None:
+        with open(f"{surrogate_dir}/{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}.surrogate.json", "w") as f:
+            json.dump(prediction, f)
+
+    return prediction
+
+
+
+
+DASHBOARD_SCREENS = {
+    'screen1': 'YAG02',
+    'screen2': 'YAG03',
+    'screen3': 'OTR2',
+}
+
+DASHBOARD_MODES = ["render", "deferred"]
+
+
+class PNGSerializer(SerializerBase):
+    """
+    Writes PNG bytes as encoded, so that the compression chosen by the flow
+    applies, and reads them back as an image
+    """
+
+    def serialize(self, filename, png: bytes):
+        with open(filename, "wb") as f:
+            f.write(png)
+
+    @classmethod
+    def deserialize(cls, filename):
+        return Image.open(filename)
+
+
+class PNGFile(File[bytes]):
+    serializer: SerializerBase = Field(PNGSerializer(), exclude=True)
 
 
 @task(log_stdout=True)
-def create_dashboard(pv_collection_isotime, impact_I):
+def create_dashboard(pv_collection_isotime, impact_I, max_workers=1, timeout=None, compress_level=6):
     DASHBOARD_KWARGS = {
-            'screen1': 'YAG02',
-            'screen2': 'YAG03',
-            'screen3': 'OTR2',
+            **DASHBOARD_SCREENS,
             'ylim' : (0, 2e-6), # Emittance scale                        
-            'name' : f"{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}"
+            'name' : f"{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}",
+            'max_workers': max_workers,
+            'timeout': timeout,
         }
 
-    return make_dashboard(impact_I, itime=pv_collection_isotime, **DASHBOARD_KWARGS)
+    dashboard = make_dashboard(impact_I, itime=pv_collection_isotime, **DASHBOARD_KWARGS)
+
+    # encoded once here, written as is by PNGFile
+    return encode_png(dashboard, compress_level=compress_level)
+
+
+@task
+def check_dashboard_deferred(dashboard_mode):
+    if dashboard_mode not in DASHBOARD_MODES:
+        raise ValueError(f"dashboard_mode must be one of {DASHBOARD_MODES}, got {dashboard_mode}")
+
+    return dashboard_mode == "deferred"
+
+
+class DashboardDataSerializer(SerializerBase):
+    def serialize(self, filename, data: DashboardData):
+        data.save(filename)
+
+    @classmethod
+    def deserialize(cls, filename):
+        return DashboardData.load(filename)
+
+
+class DashboardDataFile(File[DashboardData]):
+    serializer: SerializerBase = Field(DashboardDataSerializer(), exclude=True)
 
 
 @task(log_stdout=True)
-def format_result(pv_collection_isotime, impact_settings, impact_input_variables, impact_configuration, impact_output_variables, dashboard_file, archive_file):
+def format_dashboard_data(pv_collection_isotime, impact_I):
+    # rendered on request with lume_distgen_impact_cu_inj.dashboard.render_dashboard
+    return DashboardData.from_impact(
+        impact_I,
+        itime=pv_collection_isotime,
+        name=f"{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}",
+        **DASHBOARD_SCREENS,
+    )
+
+
+@task
+def format_dashboard_data_filename(archive_filename):
+    return dashboard_data_filename(archive_filename)
+
+
+@task
+def deferred_dashboard_file(dashboard_data_file_rep):
+    # no dashboard file is recorded until rendered
+    return None
+
+
+FIDELITY_MODES = ["full", "progressive"]
+
+# Overrides of distgen and Impact settings for the low-fidelity pass of the
+# progressive mode: 10x fewer particles and a 4x coarser space-charge grid,
+# along with 4x larger timesteps. Runs in seconds rather than minutes.
+LOW_FIDELITY_SETTINGS = {
+    "distgen": {
+        "n_particle": 1000,
+    },
+    "impact": {
+        "header:Nx": 8,
+        "header:Ny": 8,
+        "header:Nz": 8,
+    },
+}
+
+# Timesteps of the full-fidelity run, set in impact_settings or else read from
+# the archive, are scaled by this factor unless low_fidelity_settings sets them
+LOW_FIDELITY_TIMESTEPS = ["header:Dt", "change_timestep_1:dt"]
+LOW_FIDELITY_TIMESTEP_FACTOR = 4
+
+
+@task
+def check_fidelity_progressive(fidelity_mode):
+    if fidelity_mode not in FIDELITY_MODES:
+        raise ValueError(f"fidelity_mode must be one of {FIDELITY_MODES}, got {fidelity_mode}")
+
+    return fidelity_mode == "progressive"
+
+
+@task(nout=2)
+def format_low_fidelity_settings(distgen_settings, impact_settings, low_fidelity_settings=None):
+    low_fidelity_settings = low_fidelity_settings or LOW_FIDELITY_SETTINGS
+    impact_settings = impact_settings or {}
+    low_impact_settings = low_fidelity_settings.get("impact", {})
+
+    timesteps = [key for key in LOW_FIDELITY_TIMESTEPS if key not in low_impact_settings]
+    unset = [key for key in timesteps if key not in impact_settings]
+    archived = IMPACT_POOL.values(IMPACT_ARCHIVE_FILE, unset) if unset else {}
+
+    return (
+        {**(distgen_settings or {}), **low_fidelity_settings.get("distgen", {})},
+        {
+            **impact_settings,
+            **{key: LOW_FIDELITY_TIMESTEP_FACTOR * impact_settings.get(key, archived.get(key)) for key in timesteps},
+            **low_impact_settings,
+        },
+    )
+
+
+@task(nout=2)
+def apply_calibration(distgen_settings, impact_settings, calibration_file=None, calibration_tolerance=0.05):
+    if calibration_file is None:
+        return (distgen_settings, impact_settings)
+
+    calibrated_settings = Calibration.load(calibration_file).suggest(calibration_tolerance)
 
-    impact_settings.update(
-        {var_name: var.value for var_name, var in impact_input_variables.items()}
+    return (
+        {**(distgen_settings or {}), **calibrated_settings["distgen"]},
+        {**(impact_settings or {}), **calibrated_settings["impact"]},
     )
 
+
+@task(log_stdout=True)
+def format_result(pv_collection_isotime, impact_settings, impact_input_variables, impact_configuration, impact_output_variables, dashboard_file, archive_file, fidelity="full"):
+
+    # a new dict, impact_settings is also passed to later Impact runs.
+    # fidelity is "low" for the first pass of the progressive mode
+    inputs = {
+        **impact_settings,
+        **{var_name: var.value for var_name, var in impact_input_variables.items()},
+        "fidelity": fidelity,
+    }
+
     # output vars second item in tuple
     impact_outputs = {var_name: var.value for var_name, var in impact_output_variables.items()}
 
     return ImpactResult(
-        inputs=impact_settings,
+        inputs=inputs,
         outputs=impact_outputs,
         plot_file=dashboard_file,
         archive= archive_file,
@@ -165,6 +425,96 @@ def format_result(pv_collection_isotime, impact_settings, impact_input_variables
         config= impact_configuration
     )
 
+@task(log_stdout=True)
+def compute_cache_key(
+    distgen_input_variables,
+    impact_input_variables,
+    distgen_settings,
+    impact_settings,
+    distgen_configuration,
+    impact_configuration,
+    isolation_method,
+    image_tolerance,
+    auto_numprocs,
+    dashboard_mode,
+):
+    # everything that changes the particles or the Impact run: image_tolerance
+    # admits approximate cached particles and auto_numprocs the process layout.
+    # The mode decides whether the result carries a rendered or a deferred dashboard
+    return canonical_hash(
+        {var_name: var.value for var_name, var in distgen_input_variables.items()},
+        {var_name: var.value for var_name, var in impact_input_variables.items()},
+        distgen_settings,
+        impact_settings,
+        distgen_configuration,
+        impact_configuration,
+        isolation_method,
+        image_tolerance,
+        auto_numprocs,
+        dashboard_mode,
+    )
+
+
+@task(log_stdout=True)
+def load_cached_result(result_cache_dir, result_cache_size, cache_key, pv_collection_isotime):
+    if result_cache_dir is None:
+        return None
+
+    result = ResultCache(result_cache_dir, max_entries=result_cache_size).get(cache_key)
+
+    # stamp the reused result with the current acquisition time
+    if result is not None:
+        result = result.copy(update={"pv_collection_isotime": pv_collection_isotime})
+
+    return result
+
+
+@task(log_stdout=True)
+def store_cached_result(result_cache_dir, result_cache_size, cache_key, result):
+    if result_cache_dir is not None:
+        ResultCache(result_cache_dir, max_entries=result_cache_size).put(cache_key, result)
+
+
+@task(log_stdout=True)
+def impact_batch_preprocessing_task(impact_inputs):
+
+    # scale all values w.r.t. impact factor, one row per batch point
+    values = np.array(
+        [
+            [inputs.get(var_name, variable.default) for var_name, variable in IMPACT_INPUT_VARIABLES.items()]
+            for inputs in impact_inputs
+        ],
+        dtype=float,
+    )
+    scaled_values = values * IMPACT_INPUT_FACTORS
+
+    return [dict(zip(IMPACT_INPUT_VARIABLES, row)) for row in scaled_values.tolist()]
+
+
+@task(log_stdout=True)
+def evaluate_impact_batch(
+    impact_configuration: dict,
+    impact_settings: dict,
+    impact_inputs: list,
+    particles,
+    max_workers: int = None,
+):
+    impact_configuration = LUMEConfiguration(**impact_configuration)
+
+    model = ImpactModel(
+        archive_file=IMPACT_ARCHIVE_FILE,
+        configuration=impact_configuration,
+        base_settings=impact_settings,
+    )
+
+    # the handoff file is read by the batch workers only
+    try:
+        return model.evaluate_batch(impact_inputs, particles, max_workers=max_workers)
+    finally:
+        if isinstance(particles, ParticleFile):
+            particles.remove()
+
+
 # DEFINE TASK FOR SAVING DB RESULT
 # See docs: https://slaclab.github.io/lume-services/api/tasks/#lume_services.tasks.db.SaveDBResult
 save_db_result_task = SaveDBResult(timeout=30)
@@ -176,8 +526,8 @@ save_archive_file_task = SaveFile(parameter_base="archive")
 save_distgen_file_task = SaveFile(parameter_base="distgen")
 
 @task
-def format_archive_filename(pv_collection_isotime, archive_dir):
-    return f"{archive_dir}/{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}.h5"
+def format_archive_filename(pv_collection_isotime, archive_dir, suffix=""):
+    return f"{archive_dir}/{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}{suffix}.h5"
 
 
 @task
@@ -185,6 +535,13 @@ def format_dashboard_filename(pv_collection_isotime, dashboard_dir):
     return f"{dashboard_dir}/{PREFECT__CONTEXT__FLOW_ID}_{pv_collection_isotime}.png"
 
 
+def get_distgen_input_variable_parameters():
+    return {
+        var_name: Parameter(var_name, default=var.default.tolist()) if isinstance(var.default, np.ndarray) else Parameter(var_name, default=var.default)
+        for var_name, var in DISTGEN_INPUT_VARIABLES.items()
+    }
+
+
 with Flow("lume-distgen-impact-cu-inj", storage=Module(__name__)) as flow:
 
     # CONFIGURE LUME-SERVICES
@@ -197,10 +554,7 @@ with Flow("lume-distgen-impact-cu-inj", storage=Module(__name__)) as flow:
     running_local.set_upstream(configure)
 
     # SET UP INPUT VARIABLE PARAMETERS.
-    distgen_input_variable_parameter_dict = {
-        var_name: Parameter(var_name, default=var.default.tolist()) if isinstance(var.default, np.ndarray) else Parameter(var_name, default=var.default)
-        for var_name, var in DISTGEN_INPUT_VARIABLES.items()
-    }
+    distgen_input_variable_parameter_dict = get_distgen_input_variable_parameters()
 
     impact_input_variable_parameter_dict = {
         var_name: Parameter(var_name, default=var.default)
@@ -214,6 +568,26 @@ with Flow("lume-distgen-impact-cu-inj", storage=Module(__name__)) as flow:
 
     distgen_output_filename = Parameter("distgen_output_filename", default="/tmp/laser.txt")
 
+    # .npy file written by lume_distgen_impact_cu_inj.utils.save_vcc_array, replaces vcc_array if passed
+    vcc_array_file = Parameter("vcc_array_file", default=None)
+
+    # VCC image isolation backend, see lume_distgen_impact_cu_inj.utils.ISOLATION_METHODS
+    isolation_method = Parameter("isolation_method", default="watershed")
+
+    # "file" passes particles between tasks as a file in particle_dir, for distributed
+    # executors. particle_dir is required, must be shared by workers, and each file is
+    # removed once Impact has loaded it
+    particle_handoff = Parameter("particle_handoff", default="memory")
+    particle_dir = Parameter("particle_dir", default=None)
+
+    # cache of generated particles, reused when only Impact inputs change
+    particle_cache_dir = Parameter("particle_cache_dir", default=None)
+    particle_cache_size = Parameter("particle_cache_size", default=16)
+    # reuse cached particles for images within this lume_distgen_impact_cu_inj.utils.fingerprint_distance
+    image_tolerance = Parameter("image_tolerance", default=None)
+    # keep the distgen Generator across runs in the same process
+    reuse_generator = Parameter("reuse_generator", default=True)
+
     # The impact init from archive in the model.py could be completely substituted 
     # if file was saved with the updated 
     # LUME-base serializer https://github.com/slaclab/lume-base/blob/8c548e11672abce3a0cfc22b970b343d46ddba42/lume/serializers/hdf5.py#L15
@@ -228,18 +602,40 @@ with Flow("lume-distgen-impact-cu-inj", storage=Module(__name__)) as flow:
     dashboard_dir = Parameter("dashboard_dir")
     archive_dir = Parameter("archive_dir")
 
+    # dashboard panels render in the task process, or in dashboard_max_workers
+    # processes optionally bounded in seconds by dashboard_timeout
+    dashboard_max_workers = Parameter("dashboard_max_workers", default=1)
+    dashboard_timeout = Parameter("dashboard_timeout", default=None)
+    # png compression 0-9, lower trades file size for encoding time
+    dashboard_compress_level = Parameter("dashboard_compress_level", default=6)
+    # "deferred" stores compact dashboard data next to the archive instead of rendering
+    dashboard_mode = Parameter("dashboard_mode", default="render")
+
     distgen_settings = Parameter("distgen_settings")
     distgen_configuration = Parameter("distgen_configuration")
     impact_configuration = Parameter("impact_configuration")
     impact_settings = Parameter("impact_settings")
     pv_collection_isotime = DateTimeParameter("pv_collection_isotime")
 
+    # grid and particle count predicted cheapest within calibration_tolerance on
+    # end_norm_emit_x/y and end_sigma_z by a lume_distgen_impact_cu_inj.calibration.Calibration
+    # saved to calibration_file, e.g. with calibrate-impact. Overrides the settings above
+    calibration_file = Parameter("calibration_file", default=None)
+    calibration_tolerance = Parameter("calibration_tolerance", default=0.05)
+    calibrated_distgen_settings, calibrated_impact_settings = apply_calibration(distgen_settings, impact_settings, calibration_file, calibration_tolerance)
+
+    # size numprocs and the processor domain from the available cores, overriding
+    # impact_settings. Requires command_mpi in impact_configuration. Run times are
+    # recorded in impact_scaling_file, default impact_scaling.jsonl in the workdir
+    auto_numprocs = Parameter("auto_numprocs", default=False)
+    impact_scaling_file = Parameter("impact_scaling_file", default=None)
+
     # ORGANIZE INPUT VARIABLE VALUES LUME-MODEL VARIABLES
     formatted_distgen_input_vars = prepare_lume_model_variables(
         distgen_input_variable_parameter_dict, DISTGEN_INPUT_VARIABLES
     )
 
-    prepared_distgen_input_vars = distgen_preprocessing_task(formatted_distgen_input_vars)
+    prepared_distgen_input_vars = distgen_preprocessing_task(formatted_distgen_input_vars, vcc_array_file)
 
     formatted_impact_input_vars = prepare_lume_model_variables(
         impact_input_variable_parameter_dict, IMPACT_INPUT_VARIABLES
@@ -247,46 +643,216 @@ with Flow("lume-distgen-impact-cu-inj", storage=Module(__name__)) as flow:
 
     prepared_impact_input_vars = impact_preprocessing_task(formatted_impact_input_vars)
 
-    distgen_G, distgen_output_variables = evaluate_distgen(
-        distgen_configuration,
-        distgen_input_filename,
-        distgen_settings,
-        distgen_output_filename,
-        prepared_distgen_input_vars
-    )
+    # SURROGATE PREVIEW
+    # a lume_distgen_impact_cu_inj.surrogate.SurrogateImpactModel saved with save() predicts
+    # the outputs in milliseconds, the simulation below starts once the preview is written
+    surrogate_file = Parameter("surrogate_file", default=None)
+    surrogate_dir = Parameter("surrogate_dir", default=None)
+    surrogate_prediction = evaluate_surrogate(surrogate_file, prepared_impact_input_vars, pv_collection_isotime, surrogate_dir)
 
-    impact_I, impact_output_variables = evaluate_impact(
-       # impact_init_archive_filename,
-        impact_configuration,
-        impact_settings,
+    # CHECK FOR A STORED RESULT WITH IDENTICAL INPUTS
+    # Distgen and Impact are skipped entirely on a hit
+    result_cache_dir = Parameter("result_cache_dir", default=None)
+    result_cache_size = Parameter("result_cache_size", default=128)
+
+    cache_key = compute_cache_key(
+        prepared_distgen_input_vars,
         prepared_impact_input_vars,
-        distgen_G
+        calibrated_distgen_settings,
+        calibrated_impact_settings,
+        distgen_configuration,
+        impact_configuration,
+        isolation_method,
+        image_tolerance,
+        auto_numprocs,
+        dashboard_mode,
     )
+    cached_result = load_cached_result(result_cache_dir, result_cache_size, cache_key, pv_collection_isotime)
 
-    # dashbard file
-    dashboard_file_parameters = save_dashboard_image_task.parameters
-    dashboard_img = create_dashboard(pv_collection_isotime, impact_I)
-    dashboard_filename = format_dashboard_filename(pv_collection_isotime, dashboard_dir)
-    dashboard_file_rep = save_dashboard_image_task(dashboard_img, file_type=ImageFile, filename=dashboard_filename, filesystem_identifier=dashboard_file_parameters["filesystem_identifier"])
-    dashboard_file_rep.set_upstream(configure)
+    # PROGRESSIVE MODE
+    # "progressive" publishes a low-fidelity result before the full-fidelity run,
+    # low_fidelity_settings overrides LOW_FIDELITY_SETTINGS
+    fidelity_mode = Parameter("fidelity_mode", default="full")
+    low_fidelity_settings = Parameter("low_fidelity_settings", default=None)
 
-    # archive file
     archive_file_parameters = save_archive_file_task.parameters
-    archive_filename = format_archive_filename(pv_collection_isotime, archive_dir)
-    archive_file_rep = save_archive_file_task(impact_I, file_type=HDF5File,
-    filename=archive_filename, filesystem_identifier=archive_file_parameters["filesystem_identifier"])
-    archive_file_rep.set_upstream(configure)
 
-    # SAVE RESULTS TO RESULTS DATABASE, requires LUME-services results backend 
-    with case(running_local, False):
+    with case(cached_result, None):
+        fidelity_progressive = check_fidelity_progressive(fidelity_mode)
+
+        with case(fidelity_progressive, True):
+            low_distgen_settings, low_impact_settings = format_low_fidelity_settings(calibrated_distgen_settings, calibrated_impact_settings, low_fidelity_settings)
+
+            low_distgen_particles, low_distgen_output_variables = evaluate_distgen(
+                distgen_configuration,
+                distgen_input_filename,
+                low_distgen_settings,
+                distgen_output_filename,
+                prepared_distgen_input_vars,
+                isolation_method,
+                particle_handoff,
+                particle_dir,
+                particle_cache_dir,
+                particle_cache_size,
+                image_tolerance,
+                reuse_generator,
+                upstream_tasks=[surrogate_prediction],
+            )
+
+            low_impact_I, low_impact_output_variables = evaluate_impact(
+                impact_configuration,
+                low_impact_settings,
+                prepared_impact_input_vars,
+                low_distgen_particles,
+                auto_numprocs,
+                impact_scaling_file,
+            )
+
+            low_archive_filename = format_archive_filename(pv_collection_isotime, archive_dir, "_low")
+            low_archive_file_rep = save_archive_file_task(low_impact_I, file_type=HDF5File,
+            filename=low_archive_filename, filesystem_identifier=archive_file_parameters["filesystem_identifier"])
+            low_archive_file_rep.set_upstream(configure)
+
+            low_formatted_result = format_result(pv_collection_isotime, low_impact_settings, prepared_impact_input_vars, impact_configuration, low_impact_output_variables, None, low_archive_file_rep, "low")
+
+            with case(running_local, False):
+                low_saved_model_rep = save_db_result_task(low_formatted_result)
+                low_saved_model_rep.set_upstream(configure)
+
+        # the full-fidelity run starts once the low-fidelity result is published,
+        # merge completes whether or not the progressive branch was skipped
+        low_fidelity_published = merge(low_saved_model_rep, low_formatted_result)
+
+        distgen_particles, distgen_output_variables = evaluate_distgen(
+            distgen_configuration,
+            distgen_input_filename,
+            calibrated_distgen_settings,
+            distgen_output_filename,
+            prepared_distgen_input_vars,
+            isolation_method,
+            particle_handoff,
+            particle_dir,
+            particle_cache_dir,
+            particle_cache_size,
+            image_tolerance,
+            reuse_generator,
+            upstream_tasks=[surrogate_prediction, low_fidelity_published],
+        )
+
+        impact_I, impact_output_variables = evaluate_impact(
+           # impact_init_archive_filename,
+            impact_configuration,
+            calibrated_impact_settings,
+            prepared_impact_input_vars,
+            distgen_particles,
+            auto_numprocs,
+            impact_scaling_file,
+        )
+
+        # archive file
+        archive_filename = format_archive_filename(pv_collection_isotime, archive_dir)
+        archive_file_rep = save_archive_file_task(impact_I, file_type=HDF5File,
+        filename=archive_filename, filesystem_identifier=archive_file_parameters["filesystem_identifier"])
+        archive_file_rep.set_upstream(configure)
+
+        dashboard_deferred = check_dashboard_deferred(dashboard_mode)
+
+        # dashbard file
+        with case(dashboard_deferred, False):
+            dashboard_file_parameters = save_dashboard_image_task.parameters
+            dashboard_img = create_dashboard(pv_collection_isotime, impact_I, dashboard_max_workers, dashboard_timeout, dashboard_compress_level)
+            dashboard_filename = format_dashboard_filename(pv_collection_isotime, dashboard_dir)
+            rendered_dashboard_file_rep = save_dashboard_image_task(dashboard_img, file_type=PNGFile, filename=dashboard_filename, filesystem_identifier=dashboard_file_parameters["filesystem_identifier"])
+            rendered_dashboard_file_rep.set_upstream(configure)
+
+        # compact dashboard data, rendered from the archive path on request
+        with case(dashboard_deferred, True):
+            # written next to the archive by its filesystem handler, after the archive itself
+            dashboard_data = format_dashboard_data(pv_collection_isotime, impact_I)
+            dashboard_data_file_rep = save_archive_file_task(dashboard_data, file_type=DashboardDataFile,
+            filename=format_dashboard_data_filename(archive_filename), filesystem_identifier=archive_file_parameters["filesystem_identifier"],
+            upstream_tasks=[archive_file_rep])
+            dashboard_data_file_rep.set_upstream(configure)
+            deferred_dashboard_file_rep = deferred_dashboard_file(dashboard_data_file_rep)
+
+        dashboard_file_rep = merge(rendered_dashboard_file_rep, deferred_dashboard_file_rep)
+
         # CREATE LUME-services Result object
-        formatted_result = format_result(pv_collection_isotime, impact_settings, prepared_impact_input_vars, impact_configuration, impact_output_variables, dashboard_file_rep, archive_file_rep
+        formatted_result = format_result(pv_collection_isotime, calibrated_impact_settings, prepared_impact_input_vars, impact_configuration, impact_output_variables, dashboard_file_rep, archive_file_rep
         )
+        store_cached_result(result_cache_dir, result_cache_size, cache_key, formatted_result)
 
+    impact_result = merge(formatted_result, cached_result)
+
+    # SAVE RESULTS TO RESULTS DATABASE, requires LUME-services results backend 
+    with case(running_local, False):
         # RUN DATABASE_SAVE_TASK
-        saved_model_rep = save_db_result_task(formatted_result)
+        saved_model_rep = save_db_result_task(impact_result)
         saved_model_rep.set_upstream(configure)
 
 
+# Evaluates a list of Impact inputs against a single distgen distribution, e.g. for
+# scans and optimizers. impact_inputs is a list of dicts of Impact input variable
+# values in EPICS units, unspecified values take their defaults. The result is a
+# DataFrame with one row per input and a column per Impact output variable.
+with Flow("lume-distgen-impact-cu-inj-batch", storage=Module(__name__)) as batch_flow:
+
+    batch_distgen_input_variable_parameter_dict = get_distgen_input_variable_parameters()
+
+    batch_impact_inputs = Parameter("impact_inputs")
+    batch_max_workers = Parameter("max_workers", default=None)
+
+    batch_distgen_input_filename = Parameter("distgen_input_filename", default=DISTGEN_INPUT_FILE)
+    batch_distgen_output_filename = Parameter("distgen_output_filename", default="/tmp/laser.txt")
+    batch_vcc_array_file = Parameter("vcc_array_file", default=None)
+    batch_isolation_method = Parameter("isolation_method", default="watershed")
+    batch_particle_handoff = Parameter("particle_handoff", default="memory")
+    batch_particle_dir = Parameter("particle_dir", default=None)
+    batch_particle_cache_dir = Parameter("particle_cache_dir", default=None)
+    batch_particle_cache_size = Parameter("particle_cache_size", default=16)
+    batch_image_tolerance = Parameter("image_tolerance", default=None)
+    batch_reuse_generator = Parameter("reuse_generator", default=True)
+
+    batch_distgen_settings = Parameter("distgen_settings")
+    batch_distgen_configuration = Parameter("distgen_configuration")
+    batch_impact_configuration = Parameter("impact_configuration")
+    batch_impact_settings = Parameter("impact_settings")
+
+    batch_formatted_distgen_input_vars = prepare_lume_model_variables(
+        batch_distgen_input_variable_parameter_dict, DISTGEN_INPUT_VARIABLES
+    )
+
+    batch_prepared_distgen_input_vars = distgen_preprocessing_task(batch_formatted_distgen_input_vars, batch_vcc_array_file)
+
+    batch_prepared_impact_inputs = impact_batch_preprocessing_task(batch_impact_inputs)
+
+    batch_distgen_particles, batch_distgen_output_variables = evaluate_distgen(
+        batch_distgen_configuration,
+        batch_distgen_input_filename,
+        batch_distgen_settings,
+        batch_distgen_output_filename,
+        batch_prepared_distgen_input_vars,
+        batch_isolation_method,
+        batch_particle_handoff,
+        batch_particle_dir,
+        batch_particle_cache_dir,
+        batch_particle_cache_size,
+        batch_image_tolerance,
+        batch_reuse_generator,
+    )
+
+    batch_impact_outputs = evaluate_impact_batch(
+        batch_impact_configuration,
+        batch_impact_settings,
+        batch_prepared_impact_inputs,
+        batch_distgen_particles,
+        batch_max_workers,
+    )
+
+
 def get_flow():
     return flow
+
+
+def get_batch_flow():
+    return batch_flow
@@ -0,0 +1,47 @@
+"""
+Variable names and the CU_INJ device mapping, read without the simulation
+stack. Clients such as epics_queue.py that only need names and device ranges
+should import from here rather than from the package, whose variables require
+lume-model.
+"""
+import csv
+from types import MappingProxyType
+
+import yaml
+
+from lume_distgen_impact_cu_inj.files import IMPACT_VARIABLE_FILE, DISTGEN_VARIABLE_FILE, CU_INJ_MAPPING
+
+_NUMERIC_COLUMNS = ("device_min", "device_max", "scan_min", "scan_max", "impact_factor")
+
+
+def _read_mapping(filename):
+    with open(filename, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    for row in rows:
+        for column in _NUMERIC_COLUMNS:
+            row[column] = float(row[column])
+
+    return tuple(MappingProxyType(row) for row in rows)
+
+
+def _variable_names(filename):
+    with open(filename, "r") as f:
+        variables = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+    return tuple(variables["input_variables"]), tuple(variables["output_variables"])
+
+
+# rows of the mapping table, numeric columns as floats
+CU_INJ_MAPPING_RECORDS = _read_mapping(CU_INJ_MAPPING)
+
+# EPICS -> Impact scale factors keyed by impact_name
+IMPACT_FACTORS = MappingProxyType({row["impact_name"]: row["impact_factor"] for row in CU_INJ_MAPPING_RECORDS})
+
+# (device_min, device_max) keyed by device_pv_name
+DEVICE_RANGES = MappingProxyType(
+    {row["device_pv_name"]: (row["device_min"], row["device_max"]) for row in CU_INJ_MAPPING_RECORDS}
+)
+
+IMPACT_INPUT_NAMES, IMPACT_OUTPUT_NAMES = _variable_names(IMPACT_VARIABLE_FILE)
+DISTGEN_INPUT_NAMES, DISTGEN_OUTPUT_NAMES = _variable_names(DISTGEN_VARIABLE_FILE)
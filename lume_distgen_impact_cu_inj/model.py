@@ -11,9 +11,25 @@ from time import time
 import logging
 import numpy as np
 from distgen import Generator
-from lume_distgen_impact_cu_inj import IMPACT_INPUT_VARIABLES, IMPACT_OUTPUT_VARIABLES, CU_INJ_MAPPING_TABLE, DISTGEN_INPUT_VARIABLES, DISTGEN_OUTPUT_VARIABLES
-from lume_distgen_impact_cu_inj.utils import format_distgen_xy_dist, isolate_image, write_distgen_xy_dist
+from lume_distgen_impact_cu_inj import IMPACT_INPUT_VARIABLES, IMPACT_OUTPUT_VARIABLES, DISTGEN_INPUT_VARIABLES, DISTGEN_OUTPUT_VARIABLES
+from lume_distgen_impact_cu_inj.utils import (
+    format_distgen_xy_dist,
+    isolate_image,
+    write_distgen_xy_dist,
+    load_particles,
+    image_fingerprint,
+    fingerprint_distance,
+    PARTICLE_KEYS,
+)
+from lume_distgen_impact_cu_inj.cache import ParticleCache, canonical_hash
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from functools import partial
+import os
+import tempfile
+import threading
 import yaml
 
 # Gets or creates a logger
@@ -30,66 +46,558 @@ class LUMEConfiguration(BaseSettings):
     mpi_run: Optional[str]
 
 
+class ImpactPool:
+    """
+    Process-level pool of Impact objects loaded from archive files, keyed on the
+    archive, configuration and base settings. Models receive a deep copy of the
+    pooled template so the archive is only parsed once per process. Templates
+    are evicted least-recently-used beyond max_size.
+    """
+
+    def __init__(self, max_size: int = 4):
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.set_max_size(max_size)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def set_max_size(self, max_size: int):
+        if max_size < 0:
+            raise ValueError("max_size must be >= 0")
+
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._templates),
+                "max_size": self._max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def _evict(self):
+        while len(self._templates) > self._max_size:
+            self._templates.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _load(archive_file, configuration: dict, base_settings: dict = None):
+        I = Impact(**configuration, verbose=True)
+        I.load_archive(archive_file)
+
+        # Assign basic settings
+        if base_settings is not None:
+            for key, val in base_settings.items():
+                I[key] = val
+
+        return I
+
+    @staticmethod
+    def _copy(template):
+        # the copy gets its own temporary directory rather than sharing the template's
+        tempdir = getattr(template, "_tempdir", None)
+        I = deepcopy(template, {id(tempdir): None} if tempdir is not None else None)
+        I.configure()
+        return I
+
+    def _template(self, archive_file, configuration: dict, base_settings: dict = None):
+        """
+        Returns the template and whether it is pooled
+        """
+        key = canonical_hash(os.path.abspath(archive_file), os.path.getmtime(archive_file), configuration, base_settings)
+
+        with self._lock:
+            template = self._templates.get(key)
+
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if template is None:
+            template = self._load(archive_file, configuration, base_settings)
+
+            # pooling disabled
+            if self._max_size == 0:
+                return template, False
+
+            with self._lock:
+                self._templates[key] = template
+                self._evict()
+
+        return template, True
+
+    def get(self, archive_file, configuration: dict, base_settings: dict = None):
+        """
+        Returns a configured Impact object ready for evaluation.
+        """
+        template, pooled = self._template(archive_file, configuration, base_settings)
+
+        return self._copy(template) if pooled else template
+
+    def values(self, archive_file, keys, configuration: dict = None, base_settings: dict = None):
+        """
+        Returns a dict of the values of keys, e.g. "header:Dt", read from the
+        template without copying it
+        """
+        template, _ = self._template(archive_file, configuration or {}, base_settings)
+
+        return {key: template[key] for key in keys}
+
+
+IMPACT_POOL = ImpactPool(max_size=int(os.environ.get("LUME_IMPACT_POOL_SIZE", 4)))
+
+
+def _cgroup_cpu_limit():
+    """
+    CPU limit from the cgroup v2 cpu.max or v1 cfs quota, None when unlimited
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cores():
+    """
+    Returns the number of cores this process may use, from its CPU affinity
+    and any cgroup CPU quota
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, int(limit)))
+
+    return cores
+
+
+class ExecutionPlanner:
+    """
+    Chooses numprocs and the Nprow x Npcol processor domain for Impact runs.
+
+    The largest useful process count is bounded by the available cores, by
+    min_particles_per_proc and by keeping at least min_grid_per_proc grid
+    planes along y (Nprow) and z (Npcol) on each process. Run times passed to
+    record are appended to scaling_file, as JSON lines keyed by particle count
+    and grid. For a problem with measurements, halving the process count is
+    tried while it has been fastest so far, then the fastest measured layout is
+    used.
+    """
+
+    def __init__(self, scaling_file: str = None, max_numprocs: int = None, min_particles_per_proc: int = 1000, min_grid_per_proc: int = 4):
+        self._scaling_file = scaling_file
+        self._max_numprocs = max_numprocs
+        self._min_particles_per_proc = min_particles_per_proc
+        self._min_grid_per_proc = min_grid_per_proc
+
+    @property
+    def scaling_file(self):
+        return self._scaling_file
+
+    @staticmethod
+    def processor_domain(numprocs, ny, nz):
+        """
+        Returns (Nprow, Npcol) with Nprow * Npcol == numprocs, preferring
+        layouts that divide Ny and Nz evenly, then those with the least
+        boundary between subdomains
+        """
+        layouts = [(nprow, numprocs // nprow) for nprow in range(1, numprocs + 1) if numprocs % nprow == 0]
+
+        return min(
+            layouts,
+            key=lambda layout: (ny % layout[0] != 0 or nz % layout[1] != 0, ny / layout[0] + nz / layout[1]),
+        )
+
+    def max_numprocs(self, n_particle, ny, nz):
+        numprocs = min(
+            available_cores(),
+            max(1, n_particle // self._min_particles_per_proc),
+            max(1, ny // self._min_grid_per_proc) * max(1, nz // self._min_grid_per_proc),
+        )
+
+        if self._max_numprocs is not None:
+            numprocs = min(numprocs, self._max_numprocs)
+
+        return max(1, numprocs)
+
+    def _measurements(self, n_particle, grid):
+        times = {}
+        if self._scaling_file is None or not os.path.exists(self._scaling_file):
+            return times
+
+        with open(self._scaling_file, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # partially written by a concurrent run
+                    continue
+
+                if record.get("n_particle") == n_particle and record.get("grid") == list(grid):
+                    times.setdefault(record["numprocs"], []).append(record["run_time"])
+
+        return {numprocs: float(np.mean(run_times)) for numprocs, run_times in times.items()}
+
+    def plan(self, n_particle, grid):
+        """
+        Returns the settings for n_particle particles on grid (Nx, Ny, Nz):
+        numprocs, header:Nprow and header:Npcol
+        """
+        _, ny, nz = grid
+        numprocs = self.max_numprocs(n_particle, ny, nz)
+
+        candidates = [numprocs]
+        while candidates[-1] > 1:
+            candidates.append(candidates[-1] // 2)
+
+        times = self._measurements(n_particle, grid)
+        measured = [candidate for candidate in candidates if candidate in times]
+
+        for i, candidate in enumerate(candidates):
+            if candidate not in times:
+                tried = candidates[:i]
+
+                # explore fewer processes while that has been faster
+                if not tried or min(tried, key=times.get) == tried[-1]:
+                    numprocs = candidate
+                else:
+                    numprocs = min(measured, key=times.get)
+                break
+        else:
+            numprocs = min(measured, key=times.get)
+
+        nprow, npcol = self.processor_domain(numprocs, ny, nz)
+
+        return {"numprocs": numprocs, "header:Nprow": nprow, "header:Npcol": npcol}
+
+    def record(self, n_particle, grid, numprocs, run_time):
+        if self._scaling_file is None:
+            return
+
+        record = {"n_particle": n_particle, "grid": list(grid), "numprocs": numprocs, "run_time": run_time}
+
+        # single appended lines don't interleave between processes
+        with open(self._scaling_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+_DISTGEN_INPUT_CACHE = {}
+_DISTGEN_INPUT_LOCK = threading.Lock()
+
+
+def load_distgen_input(filename):
+    """
+    Returns the parsed distgen input file. The parsed file is cached per process
+    and only reparsed when its modification time changes. Callers receive a
+    deep copy they are free to modify.
+    """
+    filename = os.path.abspath(filename)
+    mtime = os.stat(filename).st_mtime_ns
+
+    with _DISTGEN_INPUT_LOCK:
+        cached = _DISTGEN_INPUT_CACHE.get(filename)
+
+    if cached is None or cached[0] != mtime:
+        with open(filename, "r") as f:
+            cached = (mtime, yaml.safe_load(f))
+
+        with _DISTGEN_INPUT_LOCK:
+            _DISTGEN_INPUT_CACHE[filename] = cached
+
+    return deepcopy(cached[1])
+
+
+# Per-process state of batch workers, set by _init_batch_worker
+_BATCH_WORKER = {}
+
+
+def _init_batch_worker(batch_dir, particles=None):
+    _BATCH_WORKER["workdir"] = tempfile.mkdtemp(prefix=f"worker-{os.getpid()}-", dir=batch_dir)
+    _BATCH_WORKER["particles"] = particles
+
+
+def _input_variables(variables, inputs):
+    input_variables = deepcopy(variables)
+
+    for var_name, variable in input_variables.items():
+        value = inputs.get(var_name, variable.default)
+
+        if isinstance(value, list):
+            value = np.array(value)
+
+        variable.value = value
+
+    return input_variables
+
+
+def _run_batch(evaluate_point, list_of_inputs, output_variable_names, *, workdir=None, max_workers=None, particles=None):
+    """
+    Maps evaluate_point over list_of_inputs in a process pool. Each worker process
+    runs in its own directory inside a temporary batch directory under workdir.
+
+    Returns a DataFrame with one row per input and one column per output variable
+    """
+    with tempfile.TemporaryDirectory(prefix="batch-", dir=workdir) as batch_dir:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_batch_worker, initargs=(batch_dir, particles)
+        ) as executor:
+            rows = list(executor.map(evaluate_point, list_of_inputs))
+
+    return pd.DataFrame(rows, columns=list(output_variable_names))
+
+
+def _evaluate_distgen_point(model_kwargs, configuration, settings, inputs):
+    workdir = _BATCH_WORKER["workdir"]
+    model = DistgenModel(
+        configuration=LUMEConfiguration(**{**configuration, "workdir": workdir}),
+        distgen_output_filename=os.path.join(workdir, "laser.txt"),
+        **model_kwargs,
+    )
+
+    input_variables = _input_variables(DISTGEN_INPUT_VARIABLES, inputs)
+    output_variables = model.evaluate(input_variables, settings=settings)
+
+    return {var_name: var.value for var_name, var in output_variables.items()}
+
+
+def _evaluate_impact_point(archive_file, configuration, base_settings, settings, inputs):
+    model = ImpactModel(
+        archive_file=archive_file,
+        configuration=LUMEConfiguration(**{**configuration, "workdir": _BATCH_WORKER["workdir"]}),
+        base_settings=base_settings,
+    )
+
+    input_variables = _input_variables(IMPACT_INPUT_VARIABLES, inputs)
+
+    try:
+        output_variables = model.evaluate(list(input_variables.values()), _BATCH_WORKER["particles"], settings=settings)
+
+    # failed runs don't abort the batch
+    except ValueError:
+        logger.exception(f"Impact evaluation failed for {inputs}")
+        return {var_name: np.nan for var_name in IMPACT_OUTPUT_VARIABLES}
+
+    return {var_name: var.value for var_name, var in output_variables.items()}
+
+
+def _grouped_fingerprint_distance(fingerprint1, fingerprint2):
+    (group1, fingerprint1), (group2, fingerprint2) = fingerprint1, fingerprint2
+    return fingerprint_distance(fingerprint1, fingerprint2) if group1 == group2 else np.inf
+
+
 class DistgenModel(BaseModel):
 
     input_variables = DISTGEN_INPUT_VARIABLES
     output_variables = DISTGEN_OUTPUT_VARIABLES
 
-    def __init__(self, *, input_file, configuration, distgen_output_filename, base_settings:dict=None):
+    def __init__(self, *, input_file, configuration, distgen_output_filename, base_settings:dict=None, isolation_method:str="watershed", reuse_generator:bool=False, particle_cache: Optional[ParticleCache]=None, image_tolerance: Optional[float]=None):
         self._input_yaml = input_file
         self._base_settings = base_settings
         self._configuration = configuration
         self._distgen_output_filename = distgen_output_filename
+        self._isolation_method = isolation_method
+
+        # With reuse_generator, the Generator built on the first evaluation is kept
+        # and later evaluations only update xy_dist, total_charge and changed settings.
+        # Settings passed to evaluate then persist until overwritten.
+        self._reuse_generator = reuse_generator
+        self._G = None
+        self._input_mtime = None
+        self._applied_settings = {}
+
+        # Particles are looked up by the distgen input, isolated image, charge and
+        # settings, so runs where only Impact inputs change skip distgen entirely
+        self._particle_cache = particle_cache
+        self._particles = None
+
+        # With image_tolerance, a cached entry is also reused for images within
+        # image_tolerance of its image by utils.fingerprint_distance, so camera
+        # noise does not defeat the cache
+        self._image_tolerance = image_tolerance
+
+    def _build_generator(self, image_rep):
+        distgen_input_yaml = load_distgen_input(self._input_yaml)
+        distgen_input_yaml['xy_dist'] = image_rep
 
-    def evaluate(self, input_variables, settings:dict=None):
+        self._G = Generator(distgen_input_yaml, **self._configuration.dict(), verbose= True)
+        self._input_mtime = os.stat(self._input_yaml).st_mtime_ns
+        self._applied_settings = {}
 
-        with open(self._input_yaml, "r") as f:
-            distgen_input_yaml = yaml.safe_load(f)
+        if self._base_settings is not None:
+            for setting, val in self._base_settings.items():
+                self._G[setting] = val
 
+    def _apply_setting(self, key, val):
+        # skip values the reused generator already holds
+        if key in self._applied_settings and self._applied_settings[key] == val:
+            return
+
+        self._G[key] = val
+        self._applied_settings[key] = val
+
+    def evaluate(self, input_variables, settings:dict=None):
 
         image = input_variables["vcc_array"].value.reshape(input_variables["vcc_size_y"].value, input_variables["vcc_size_x"].value)
 
         image_rep = format_distgen_xy_dist(image,
             input_variables["vcc_resolution"].value,
-            resolution_units=input_variables["vcc_resolution_units"].value
+            resolution_units=input_variables["vcc_resolution_units"].value,
+            isolation_method=self._isolation_method,
         )
 
-        distgen_input_yaml['xy_dist'] = image_rep
+        total_charge = input_variables["total_charge"].value
 
-        self._G = Generator(distgen_input_yaml, **self._configuration.dict(), verbose= True)
+        if self._particle_cache is not None:
+            resolution = (input_variables["vcc_resolution"].value, input_variables["vcc_resolution_units"].value)
+            key, fingerprint = self._particle_cache_key(image_rep, resolution, total_charge, settings)
+            self._particles = self._particle_cache.get(key)
 
-        self._G["total_charge:value"] = input_variables["total_charge"].value
+            if self._particles is None:
+                self._particles = self._generate(image_rep, total_charge, settings)
+                self._particle_cache.put(key, self._particles, fingerprint=fingerprint)
 
-        if self._base_settings is not None:
-            for setting, val in self._base_settings.items():
-                self._G[setting] = val
+        else:
+            self._particles = self._generate(image_rep, total_charge, settings)
+
+        # outputs reference the generated particle arrays rather than copying them
+        for var_name in PARTICLE_KEYS:
+            self.output_variables[var_name].value = self._particles._data[var_name]
+
+        return self.output_variables
+
+    def _particle_cache_key(self, image_rep, resolution, total_charge, settings):
+        """
+        Returns the cache key and, with an image tolerance, the fingerprint to
+        store with a new entry
+        """
+        # settings passed earlier persist on a reused generator
+        effective_settings = dict(self._applied_settings) if self._reuse_generator else {}
+        if settings is not None:
+            effective_settings.update(settings)
+
+        distgen_input = load_distgen_input(self._input_yaml)
 
+        key = canonical_hash(
+            distgen_input, self._base_settings, image_rep, total_charge, effective_settings
+        )
+
+        if self._image_tolerance is None:
+            return key, None
+
+        # only images with otherwise identical inputs are compared
+        group = canonical_hash(
+            distgen_input, self._base_settings, resolution, str(image_rep["P"].units), total_charge, effective_settings
+        )
+        fingerprint = (group, image_fingerprint(image_rep["P"].magnitude))
+
+        nearest_key, distance = self._particle_cache.nearest(fingerprint, _grouped_fingerprint_distance)
+        if distance <= self._image_tolerance:
+            logger.info(f"Reusing particles for an image at distance {distance:.3g}")
+            key = nearest_key
+
+        return key, fingerprint
+
+    def _generate(self, image_rep, total_charge, settings):
+        reuse = (
+            self._reuse_generator
+            and self._G is not None
+            and self._input_mtime == os.stat(self._input_yaml).st_mtime_ns
+        )
+
+        if reuse:
+            self._G["xy_dist"] = image_rep
+        else:
+            self._build_generator(image_rep)
+
+        self._G["total_charge:value"] = total_charge
 
         # Assign updated settings
         if settings is not None:
             for key, val in settings.items():
-                self._G[key] = val
+                self._apply_setting(key, val)
 
         self._G.run()
 
         # not sure about the format here...
         #write_distgen_xy_dist(self._distgen_output_filename, image_rep, #input_variables["vcc_resolution"].value, resolution_units=input_variables#["vcc_resolution_units"].value)
 
-        self.output_variables["x"].value = self._G.particles._data["x"]
-        self.output_variables["px"].value = self._G.particles._data["px"]
-        self.output_variables["y"].value = self._G.particles._data["y"]
-        self.output_variables["py"].value = self._G.particles._data["py"]
-        self.output_variables["z"].value = self._G.particles._data["z"]
-        self.output_variables["pz"].value = self._G.particles._data["pz"]
-        self.output_variables["t"].value = self._G.particles._data["t"]
-        self.output_variables["status"].value = self._G.particles._data["status"]
-        self.output_variables["weight"].value = self._G.particles._data["weight"]
-        self.output_variables["species"].value = self._G.particles._data["species"]
+        return self._G.particles
 
-        return self.output_variables
+    def evaluate_batch(self, list_of_inputs, settings:dict=None, max_workers:int=None):
+        """
+        Evaluates each dict of input values in list_of_inputs in a process pool of
+        max_workers processes (default: number of CPUs). Unspecified inputs take
+        their variable defaults.
+
+        Returns a DataFrame with a column of particle arrays per output variable
+        """
+        evaluate_point = partial(
+            _evaluate_distgen_point,
+            {
+                "input_file": self._input_yaml,
+                "base_settings": self._base_settings,
+                "isolation_method": self._isolation_method,
+                "particle_cache": self._particle_cache,
+                "image_tolerance": self._image_tolerance,
+            },
+            self._configuration.dict(),
+            settings,
+        )
+
+        return _run_batch(
+            evaluate_point,
+            list_of_inputs,
+            self.output_variables,
+            workdir=self._configuration.workdir,
+            max_workers=max_workers,
+        )
 
     def get_particles(self):
-        return self._G.particles
+        return self._particles
+
+    @property
+    def particles(self):
+        """
+        ParticleGroup from the last evaluation. Hand this, rather than the
+        Generator, to ImpactModel.evaluate: it holds only the particle arrays,
+        which the output variables share.
+        """
+        return self._particles
 
     @property
     def G(self):
@@ -103,19 +611,23 @@ class ImpactModel(BaseModel):
     output_variables = IMPACT_OUTPUT_VARIABLES
 
     def __init__(
-        self, *, archive_file: str, configuration: LUMEConfiguration, base_settings:dict=None,
+        self, *, archive_file: str, configuration: LUMEConfiguration, base_settings:dict=None, pool: Optional[ImpactPool]=IMPACT_POOL,
+        planner: Optional[ExecutionPlanner]=None,
     ):
         self._archive_file = archive_file
         self._configuration = configuration.dict()
         self._settings = base_settings
 
-        self._I = Impact(**self._configuration, verbose=True)
-        self._I.load_archive(archive_file)
+        # sizes numprocs per run, overriding settings, which needs an MPI build
+        if planner is not None and not self._configuration.get("command_mpi"):
+            raise ValueError("An ExecutionPlanner requires command_mpi in the configuration")
+        self._planner = planner
 
-        # Assign basic settings
-        if base_settings is not None:
-            for key, val in self._settings.items():
-                self._I[key] = val
+        # pass pool=None to always load the archive
+        if pool is not None:
+            self._I = pool.get(archive_file, self._configuration, base_settings)
+        else:
+            self._I = ImpactPool._load(archive_file, self._configuration, base_settings)
 
 
     def evaluate(self, input_variables, particles, settings:dict=None):
@@ -129,7 +641,20 @@ class ImpactModel(BaseModel):
         for var in input_variables:
             self._I[var.name] = var.value
 
-        self._I.initial_particles = particles
+        # particle files are read here, at the first evaluation that needs them
+        self._I.initial_particles = load_particles(particles)
+
+        if self._planner is not None:
+            n_particle = self._I.initial_particles.n_particle
+            grid = (self._I.header["Nx"], self._I.header["Ny"], self._I.header["Nz"])
+            plan = self._planner.plan(n_particle, grid)
+
+            # numprocs first, its setter picks a default processor domain
+            for key, val in plan.items():
+                self._I[key] = val
+            self._I.use_mpi = plan["numprocs"] > 1
+
+            logger.info(f"Planned {plan} for {n_particle} particles on a {grid} grid")
 
         logger.info(f"Running evaluate_impact_with_distgen...")
 
@@ -137,13 +662,17 @@ class ImpactModel(BaseModel):
 
         self._I.run()
 
-        logger.info(f"Completed execution in {(time()-t0)/60:.1f} min...")
+        run_time = time() - t0
+        logger.info(f"Completed execution in {run_time/60:.1f} min...")
 
         outputs = default_impact_merit(self._I)
 
         if outputs.get("error"):
             raise ValueError("Error returned from run.")
 
+        if self._planner is not None:
+            self._planner.record(n_particle, grid, plan["numprocs"], run_time)
+
         # format output variables
         for var_name in outputs:
             if var_name in self.output_variables:
@@ -151,6 +680,33 @@ class ImpactModel(BaseModel):
 
         return self.output_variables
 
+    def evaluate_batch(self, list_of_inputs, particles, settings:dict=None, max_workers:int=None):
+        """
+        Tracks particles for each dict of input values in list_of_inputs in a
+        process pool of max_workers processes (default: number of CPUs).
+        Unspecified inputs take their variable defaults. Particles are sent
+        once to each worker, pass a ParticleFile to have workers read them
+        from disk instead.
+
+        Returns a DataFrame with one row per input and a column per output
+        variable, rows of failed runs are NaN
+        """
+        evaluate_point = partial(
+            _evaluate_impact_point,
+            self._archive_file,
+            self._configuration,
+            self._settings,
+            settings,
+        )
+
+        return _run_batch(
+            evaluate_point,
+            list_of_inputs,
+            self.output_variables,
+            workdir=self._configuration.get("workdir"),
+            max_workers=max_workers,
+            particles=particles,
+        )
     
     @property
     def I(self):
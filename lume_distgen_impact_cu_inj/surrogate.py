@@ -0,0 +1,262 @@
+from lume_model.models import BaseModel
+import logging
+import os
+import tempfile
+from copy import deepcopy
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from lume_distgen_impact_cu_inj import IMPACT_INPUT_VARIABLES, IMPACT_OUTPUT_VARIABLES
+
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+
+# hyperparameter grids searched by marginal likelihood, in standardized units
+LENGTH_SCALES = np.geomspace(0.25, 8.0, 11)
+NOISE_LEVELS = np.geomspace(1e-6, 1e-1, 6)
+
+
+def _rbf(X1, X2, length_scale):
+    X1, X2 = X1 / length_scale, X2 / length_scale
+    sqdist = np.sum(X1**2, axis=1)[:, None] + np.sum(X2**2, axis=1)[None, :] - 2 * X1 @ X2.T
+    return np.exp(-0.5 * np.maximum(sqdist, 0))
+
+
+def _log_marginal_likelihood(K, Y):
+    """
+    Summed over the columns of Y, returns None if K is not positive definite
+    """
+    try:
+        L = np.linalg.cholesky(K)
+    except np.linalg.LinAlgError:
+        return None
+
+    alpha = np.linalg.solve(L.T, np.linalg.solve(L, Y))
+    return -0.5 * np.sum(Y * alpha) - Y.shape[1] * np.sum(np.log(np.diag(L)))
+
+
+def _result_values(result, attribute):
+    # ImpactResult or a dict with inputs and outputs
+    return result[attribute] if isinstance(result, dict) else getattr(result, attribute)
+
+
+class SurrogateImpactModel(BaseModel):
+    """
+    Gaussian process surrogate of ImpactModel trained on stored flow results,
+    using NumPy only. Inputs are the Impact input variables in Impact units, as
+    passed to ImpactModel.evaluate, and outputs are the scalar Impact output
+    variables. A single squared exponential kernel over standardized inputs is
+    shared by all standardized outputs, with the length scale and noise chosen
+    by marginal likelihood.
+    """
+
+    input_variables = IMPACT_INPUT_VARIABLES
+    output_variables = IMPACT_OUTPUT_VARIABLES
+
+    def __init__(self, *, input_names, output_names, X, alpha, L_inv, x_mean, x_std, y_mean, y_std, length_scale, noise):
+        self._input_names = list(input_names)
+        self._output_names = list(output_names)
+        self._X = X
+        self._alpha = alpha
+        self._L_inv = L_inv
+        self._x_mean, self._x_std = x_mean, x_std
+        self._y_mean, self._y_std = y_mean, y_std
+        self._length_scale = length_scale
+        self._noise = noise
+        self._uncertainty = {}
+
+        # predictions run alongside ImpactModel in flows, so they don't share output variables
+        self.output_variables = deepcopy(IMPACT_OUTPUT_VARIABLES)
+
+    @classmethod
+    def fit(cls, X, Y, input_names=None, output_names=None):
+        """
+        Trains on inputs X (n_samples, n_inputs) and outputs Y (n_samples,
+        n_outputs), ordered as input_names and output_names (default: all Impact
+        input and output variables). Samples with non-finite values are dropped
+        and repeated inputs, such as stored cache hits, are merged into one
+        sample with their mean output, as duplicates make the kernel matrix
+        singular and bias the noise level.
+        """
+        input_names = list(input_names or IMPACT_INPUT_VARIABLES)
+        output_names = list(output_names or IMPACT_OUTPUT_VARIABLES)
+
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        if X.shape != (len(Y), len(input_names)) or Y.shape[1:] != (len(output_names),):
+            raise ValueError(f"Expected X of shape (n, {len(input_names)}) and Y of shape (n, {len(output_names)}), got {X.shape} and {Y.shape}")
+
+        finite = np.isfinite(X).all(axis=1) & np.isfinite(Y).all(axis=1)
+        X, Y = X[finite], Y[finite]
+
+        X, index = np.unique(X, axis=0, return_inverse=True)
+        index = index.ravel()
+        Y = np.stack([np.bincount(index, weights=y, minlength=len(X)) for y in Y.T], axis=1) / np.bincount(index)[:, None]
+        if len(X) < 2:
+            raise ValueError(f"At least 2 finite samples are required, got {len(X)}")
+
+        # constant columns are left unscaled
+        x_mean, x_std = X.mean(axis=0), X.std(axis=0)
+        x_std[x_std == 0] = 1
+        y_mean, y_std = Y.mean(axis=0), Y.std(axis=0)
+        y_std[y_std == 0] = 1
+
+        Xs = (X - x_mean) / x_std
+        Ys = (Y - y_mean) / y_std
+
+        best = None
+        for length_scale in LENGTH_SCALES:
+            K = _rbf(Xs, Xs, length_scale)
+            for noise in NOISE_LEVELS:
+                lml = _log_marginal_likelihood(K + noise * np.eye(len(Xs)), Ys)
+                if lml is not None and (best is None or lml > best[0]):
+                    best = (lml, length_scale, noise)
+
+        if best is None:
+            raise ValueError("Kernel matrix is singular for all hyperparameters")
+
+        _, length_scale, noise = best
+        L = np.linalg.cholesky(_rbf(Xs, Xs, length_scale) + noise * np.eye(len(Xs)))
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, Ys))
+
+        # predictive variances are a product with the inverse factor
+        L_inv = np.linalg.inv(L)
+
+        logger.info(f"Trained surrogate on {len(Xs)} samples, length scale {length_scale:.3g}, noise {noise:.3g}")
+
+        return cls(
+            input_names=input_names,
+            output_names=output_names,
+            X=Xs,
+            alpha=alpha,
+            L_inv=L_inv,
+            x_mean=x_mean,
+            x_std=x_std,
+            y_mean=y_mean,
+            y_std=y_std,
+            length_scale=length_scale,
+            noise=noise,
+        )
+
+    @classmethod
+    def from_results(cls, results: Iterable):
+        """
+        Trains on stored flow results, ImpactResults or dicts with inputs and
+        outputs, over the Impact output variables present in all of them.
+        Low-fidelity results of the progressive mode are skipped, results
+        without a fidelity input predate it and are full fidelity.
+        """
+        results = [
+            result for result in results
+            if _result_values(result, "inputs").get("fidelity", "full") == "full"
+        ]
+        input_names = list(IMPACT_INPUT_VARIABLES)
+        output_names = [
+            var_name for var_name in IMPACT_OUTPUT_VARIABLES
+            if all(var_name in _result_values(result, "outputs") for result in results)
+        ]
+
+        X = [[_result_values(result, "inputs")[var_name] for var_name in input_names] for result in results]
+        Y = [[_result_values(result, "outputs")[var_name] for var_name in output_names] for result in results]
+
+        return cls.fit(np.reshape(X, (len(results), -1)), np.reshape(Y, (len(results), -1)), input_names, output_names)
+
+    def predict(self, X):
+        """
+        Returns predicted means and standard deviations of shape (n_samples,
+        n_outputs) for inputs X of shape (n_samples, n_inputs)
+        """
+        Xs = (np.atleast_2d(np.asarray(X, dtype=float)) - self._x_mean) / self._x_std
+        K = _rbf(Xs, self._X, self._length_scale)
+
+        mean = K @ self._alpha
+        v = self._L_inv @ K.T
+        var = np.maximum(1 - np.sum(v**2, axis=0), 0)
+
+        return self._y_mean + mean * self._y_std, np.sqrt(var)[:, None] * self._y_std
+
+    def evaluate(self, input_variables, particles=None, settings: dict = None):
+        """
+        Same interface as ImpactModel.evaluate. particles and settings are
+        accepted for compatibility and ignored, the surrogate is conditioned on
+        the training distribution and settings.
+        """
+        values = {var.name: var.value for var in input_variables}
+        missing = set(self._input_names) - set(values)
+        if missing:
+            raise ValueError(f"Missing surrogate inputs {sorted(missing)}")
+
+        mean, std = self.predict([[values[var_name] for var_name in self._input_names]])
+
+        for var_name, val, err in zip(self._output_names, mean[0].tolist(), std[0].tolist()):
+            self.output_variables[var_name].value = val
+            self._uncertainty[var_name] = err
+
+        return self.output_variables
+
+    def evaluate_batch(self, list_of_inputs):
+        """
+        Predicts each dict of input values in list_of_inputs, unspecified inputs
+        take their variable defaults. Returns a DataFrame with one row per input
+        and a column per predicted output variable.
+        """
+        X = [
+            [inputs.get(var_name, IMPACT_INPUT_VARIABLES[var_name].default) for var_name in self._input_names]
+            for inputs in list_of_inputs
+        ]
+        mean, _ = self.predict(np.reshape(X, (len(list_of_inputs), -1)))
+
+        return pd.DataFrame(mean, columns=self._output_names)
+
+    def save(self, filename):
+        """
+        Writes the trained surrogate to filename as .npz, returns filename
+        """
+        dirname = os.path.dirname(os.path.abspath(filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                input_names=np.array(self._input_names),
+                output_names=np.array(self._output_names),
+                X=self._X,
+                alpha=self._alpha,
+                L_inv=self._L_inv,
+                x_mean=self._x_mean,
+                x_std=self._x_std,
+                y_mean=self._y_mean,
+                y_std=self._y_std,
+                length_scale=self._length_scale,
+                noise=self._noise,
+            )
+        os.replace(tmp_filename, filename)
+
+        return filename
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=False) as data:
+            kwargs = {key: data[key] for key in data.files}
+
+        kwargs["input_names"] = kwargs["input_names"].tolist()
+        kwargs["output_names"] = kwargs["output_names"].tolist()
+        kwargs["length_scale"] = float(kwargs["length_scale"])
+        kwargs["noise"] = float(kwargs["noise"])
+
+        return cls(**kwargs)
+
+    @property
+    def uncertainty(self):
+        """
+        Predictive standard deviations of the output variables from the last evaluate
+        """
+        return dict(self._uncertainty)
+
+    @property
+    def input_names(self):
+        return list(self._input_names)
+
+    @property
+    def output_names(self):
+        return list(self._output_names)
@@ -0,0 +1,133 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import lume_model.utils
+import numpy as np
+import pint
+from pmd_beamphysics import ParticleGroup
+from lume_distgen_impact_cu_inj.cache import ResultCache, ParticleCache, canonical_hash, load_variables, snapshot_dir
+from lume_distgen_impact_cu_inj.files import IMPACT_VARIABLE_FILE
+
+
+def test_canonical_hash():
+    assert canonical_hash({"a": 1, "b": 2.0}) == canonical_hash({"b": 2.0, "a": 1})
+    assert canonical_hash({"a": np.arange(10)}) == canonical_hash({"a": np.arange(10)})
+    assert canonical_hash({"a": np.arange(10)}) != canonical_hash({"a": np.arange(1, 11)})
+    assert canonical_hash({"a": 0.1}) != canonical_hash({"a": 0.1000000001})
+
+    # quantities hash their full magnitude, not a truncated repr
+    image = np.zeros((100, 100))
+    changed = image.copy()
+    changed[50, 50] = 1
+    ureg = pint.UnitRegistry()
+    assert canonical_hash(image * ureg("um")) != canonical_hash(changed * ureg("um"))
+    assert canonical_hash(image * ureg("um")) != canonical_hash(image * ureg("mm"))
+
+
+def test_result_cache_lru(tmp_path):
+    cache = ResultCache(tmp_path, max_entries=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # touch a so that b is the least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.get("b") is None
+
+    stats = cache.stats
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+    # counters persist across instances
+    assert ResultCache(tmp_path, max_entries=2).stats["hits"] == 1
+
+
+def test_result_cache_concurrent_stats(tmp_path):
+    # one instance per worker, as with flows sharing result_cache_dir
+    def miss(i):
+        ResultCache(tmp_path).get(f"missing-{i}")
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(miss, range(200)))
+
+    assert ResultCache(tmp_path).stats["misses"] == 200
+
+
+def test_particle_cache(tmp_path):
+    n_particle = 1000
+    rng = np.random.default_rng(0)
+    data = {key: rng.normal(size=n_particle) for key in ["x", "px", "y", "py", "z", "pz", "t"]}
+    data.update(status=np.ones(n_particle, dtype=int), weight=np.full(n_particle, 1e-16), species="electron")
+    particle_group = ParticleGroup(data=data)
+
+    cache = ParticleCache(tmp_path, max_entries=1)
+    cache.put("a", particle_group)
+
+    cached = cache.get("a")
+    assert cached.species == "electron"
+    for key in ["x", "px", "y", "py", "z", "pz", "t", "status", "weight"]:
+        np.testing.assert_array_equal(cached[key], particle_group[key])
+
+    cache.put("b", particle_group)
+    assert "a" not in cache
+    assert cache.stats["evictions"] == 1
+
+
+def test_particle_cache_nearest(tmp_path):
+    particle_group = ParticleGroup(data={"x": np.zeros(2), "px": np.zeros(2), "y": np.zeros(2), "py": np.zeros(2), "z": np.zeros(2), "pz": np.ones(2), "t": np.zeros(2), "status": np.ones(2), "weight": np.ones(2), "species": "electron"})
+
+    cache = ParticleCache(tmp_path, max_entries=2)
+    distance = lambda a, b: abs(a - b)
+
+    assert cache.nearest(1.0, distance) == (None, np.inf)
+
+    cache.put("a", particle_group, fingerprint=1.0)
+    cache.put("b", particle_group, fingerprint=2.0)
+    assert cache.nearest(1.2, distance)[0] == "a"
+
+    # fingerprints leave with their entries
+    cache.put("c", particle_group, fingerprint=5.0)
+    assert cache.nearest(1.2, distance)[0] == "b"
+
+
+def test_load_variables(tmp_path, monkeypatch):
+    filename = str(tmp_path / "variables.yml")
+    shutil.copy(IMPACT_VARIABLE_FILE, filename)
+
+    # snapshots go to the per-user cache, not next to the YAML
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    n_parse = []
+    variables_from_yaml = lume_model.utils.variables_from_yaml
+    monkeypatch.setattr(lume_model.utils, "variables_from_yaml", lambda f: n_parse.append(f) or variables_from_yaml(f))
+
+    t0 = perf_counter()
+    input_variables, output_variables = load_variables(filename)
+    parse_time = perf_counter() - t0
+
+    t0 = perf_counter()
+    cached_input_variables, cached_output_variables = load_variables(filename)
+    snapshot_time = perf_counter() - t0
+
+    print(f"load_variables: YAML {parse_time*1e3:.2f} ms, snapshot {snapshot_time*1e3:.2f} ms")
+
+    assert len(n_parse) == 1
+    assert os.listdir(snapshot_dir()) and sorted(os.listdir(tmp_path)) == ["cache", "variables.yml"]
+    assert list(cached_input_variables) == list(input_variables)
+    assert list(cached_output_variables) == list(output_variables)
+    assert cached_input_variables["SOL1:solenoid_field_scale"].value_range == input_variables["SOL1:solenoid_field_scale"].value_range
+
+    # edits to the YAML invalidate the snapshot
+    with open(filename, "a") as f:
+        f.write("\n")
+
+    load_variables(filename)
+    assert len(n_parse) == 2
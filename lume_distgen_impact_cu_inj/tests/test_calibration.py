@@ -0,0 +1,43 @@
+import numpy as np
+from lume_distgen_impact_cu_inj.calibration import Calibration, CALIBRATION_GRIDS, CALIBRATION_N_PARTICLES, CALIBRATION_OUTPUTS
+
+
+def _record(grid, n_particle, seed=0):
+    # shot noise in the particle count and discretization error in the grid
+    rng = np.random.default_rng(seed)
+    error = 0.3 / np.sqrt(n_particle) + 2 / grid**2
+    return {
+        "grid": grid,
+        "n_particle": n_particle,
+        "run_time": 1e-5 * n_particle * (1 + 1e-4 * grid**3),
+        "outputs": {var_name: 1.0 + error * rng.choice([-1, 1]) for var_name in CALIBRATION_OUTPUTS},
+    }
+
+
+def test_calibration(tmp_path):
+    reference = {**_record(64, 30000), "outputs": {var_name: 1.0 for var_name in CALIBRATION_OUTPUTS}}
+    records = [_record(grid, n_particle, i) for i, (grid, n_particle) in enumerate(
+        (grid, n_particle) for grid in CALIBRATION_GRIDS for n_particle in CALIBRATION_N_PARTICLES
+    )]
+    calibration = Calibration(records, reference)
+
+    # the fitted error model recovers the measured errors
+    grid = np.array([record["grid"] for record in records])
+    n_particle = np.array([record["n_particle"] for record in records])
+    measured = np.max([calibration.errors(var_name) for var_name in CALIBRATION_OUTPUTS], axis=0)
+    np.testing.assert_allclose(calibration.predict_error(grid, n_particle), measured, rtol=0.5)
+
+    settings = calibration.suggest(0.01)
+    grid, n_particle = settings["impact"]["header:Nx"], settings["distgen"]["n_particle"]
+
+    assert settings["impact"]["header:Ny"] == settings["impact"]["header:Nz"] == grid
+    assert calibration.predict_error(grid, n_particle) <= 0.01
+    assert calibration.predict_run_time(grid, n_particle) < reference["run_time"]
+
+    # a looser tolerance is cheaper, an unreachable one falls back to the reference
+    loose = calibration.suggest(0.05)
+    assert calibration.predict_run_time(loose["impact"]["header:Nx"], loose["distgen"]["n_particle"]) <= calibration.predict_run_time(grid, n_particle)
+    assert calibration.suggest(1e-9)["distgen"]["n_particle"] == reference["n_particle"]
+
+    loaded = Calibration.load(calibration.save(str(tmp_path / "calibration.json")))
+    assert loaded.suggest(0.01) == settings
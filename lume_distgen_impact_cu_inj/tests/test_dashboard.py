@@ -0,0 +1,283 @@
+import io
+import multiprocessing
+import os
+import resource
+from time import perf_counter, sleep
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+from pmd_beamphysics import ParticleGroup
+from lume_distgen_impact_cu_inj.dashboard import (
+    make_dashboard,
+    composite_dashboard,
+    encode_png,
+    DashboardData,
+    dashboard_data_filename,
+    render_dashboard,
+    histogram2d,
+    iscreen,
+    render_panels,
+)
+
+
+def _particle_group(n_particle, seed):
+    rng = np.random.default_rng(seed)
+    return ParticleGroup(
+        data={
+            "x": rng.normal(0, 1e-3, n_particle),
+            "px": rng.normal(0, 1e3, n_particle),
+            "y": rng.normal(0, 1e-3, n_particle),
+            "py": rng.normal(0, 1e3, n_particle),
+            "z": rng.normal(1, 1e-3, n_particle),
+            "pz": rng.normal(6e7, 1e5, n_particle),
+            "t": np.zeros(n_particle),
+            "status": np.ones(n_particle, dtype=int),
+            "weight": np.full(n_particle, 250e-12 / n_particle),
+            "species": "electron",
+        }
+    )
+
+
+class ImpactRun:
+    """
+    Minimal stand-in for a finished Impact run exposing what the dashboard reads,
+    with real particle groups at each screen
+    """
+
+    def __init__(self, n_particle=10000):
+        screens = ["initial_particles", "YAG02", "YAG03", "OTR2", "final_particles"]
+        self.particles = {screen: _particle_group(n_particle, seed) for seed, screen in enumerate(screens)}
+        self.output = {"run_info": {"run_time": 60.0}}
+        self.header = {"Np": n_particle, "Nbunch": 1, "Nprow": 1, "Npcol": 1, "Nx": 32, "Ny": 32, "Nz": 32, "Dt": 5e-13}
+        self.ele = {"change_timestep_1": {"dt": 4e-12, "s": 0.1}}
+
+    def __getitem__(self, key):
+        return {"species": "electron", "total_charge": 250e-12}[key]
+
+    def stat(self, key):
+        return np.linspace(0, 16.5 if key == "mean_z" else 1e-6, 500)
+
+    def units(self, key):
+        return self.particles["initial_particles"].units(key)
+
+    def plot(self, y, y2=None, ylim=None, ylim2=None, figsize=None, return_figure=False):
+        z = np.linspace(0, 16.5, 500)
+        fig, ax = plt.subplots(figsize=figsize)
+        for key in y:
+            ax.plot(z, np.full_like(z, 1e-6), label=key)
+        ax.set_ylim(ylim)
+        ax2 = ax.twinx()
+        for key in y2:
+            ax2.plot(z, np.full_like(z, 1e-3), label=key)
+        ax2.set_ylim(ylim2)
+        return fig
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# the long run is opt-in, a few dashboards check that figures are released
+@pytest.mark.parametrize("n_dashboard", [3, pytest.param(100, marks=pytest.mark.slow)])
+def test_dashboard_memory(n_dashboard):
+    impact_run = ImpactRun()
+
+    # warm up matplotlib caches
+    for _ in range(2):
+        make_dashboard(impact_run, itime="test", max_workers=1)
+
+    rss = _max_rss_mb()
+
+    for _ in range(n_dashboard):
+        make_dashboard(impact_run, itime="test", max_workers=1)
+
+    growth = _max_rss_mb() - rss
+
+    print(f"RSS growth over {n_dashboard} dashboards: {growth:.1f} MB")
+
+    assert plt.get_fignums() == []
+    assert growth < 50
+
+
+def test_deferred_dashboard(tmp_path):
+    impact_run = ImpactRun()
+    archive_file = str(tmp_path / "run.h5")
+
+    data = DashboardData.from_impact(impact_run, itime="test", name="run")
+    data_file = data.save(dashboard_data_filename(archive_file))
+    assert os.path.getsize(data_file) < 1e6
+
+    loaded = DashboardData.load(data_file)
+    assert (loaded.itime, loaded.name) == ("test", "run")
+    for key, stat in data.stats.items():
+        np.testing.assert_array_equal(loaded.stat(key), stat)
+
+    # rendered from the stored data as from the data it was stored from
+    filename = render_dashboard(archive_file, max_workers=1)
+    expected = make_dashboard(data, itime="test", name="run", max_workers=1)
+
+    with Image.open(filename) as image:
+        np.testing.assert_array_equal(np.asarray(image), np.asarray(expected))
+
+    assert make_dashboard(impact_run, itime="test", name="run", max_workers=1).size == expected.size
+
+
+def test_histogram2d():
+    particle_group = _particle_group(100000, 0)
+    x, y, weight = particle_group["x"], particle_group["y"], particle_group["weight"]
+
+    expected, expected_xedges, expected_yedges = np.histogram2d(x, y, bins=100, weights=weight)
+    hist, xedges, yedges = histogram2d(x, y, bins=100, weights=weight)
+
+    np.testing.assert_array_equal(xedges, expected_xedges)
+    np.testing.assert_array_equal(yedges, expected_yedges)
+    np.testing.assert_allclose(hist, expected, rtol=1e-12, atol=0)
+
+
+def test_iscreen():
+    impact_run = ImpactRun()
+
+    images = {
+        method: iscreen(impact_run, screen="OTR2", dpi=150, as_array=True, method=method)
+        for method in ["histogram", "scatter"]
+    }
+
+    # both renderers fill the same dashboard panel
+    assert images["histogram"].shape == images["scatter"].shape
+    np.testing.assert_array_equal(
+        iscreen(impact_run, screen="OTR2", dpi=150, as_array=True, method="histogram"), images["histogram"]
+    )
+    assert plt.get_fignums() == []
+
+
+def _slow_panel(impact_object, seconds):
+    sleep(seconds)
+    return np.zeros((1, 1, 4), dtype=np.uint8)
+
+
+def test_render_panels_pool():
+    impact_run = ImpactRun()
+    panels = {
+        screen: (iscreen, {"screen": screen, "dpi": 50, "as_array": True})
+        for screen in ["YAG02", "YAG03", "OTR2"]
+    }
+
+    images, _ = render_panels(impact_run, panels)
+    pooled_images, timings = render_panels(impact_run, panels, max_workers=2)
+
+    assert list(pooled_images) == list(panels) == list(timings)
+    for screen, image in images.items():
+        np.testing.assert_array_equal(pooled_images[screen], image)
+
+    assert multiprocessing.active_children() == []
+
+
+def test_render_panels_timeout():
+    panels = {"fast": (_slow_panel, {"seconds": 0}), "slow": (_slow_panel, {"seconds": 60})}
+
+    t0 = perf_counter()
+    with pytest.raises(TimeoutError):
+        render_panels(ImpactRun(n_particle=10), panels, max_workers=2, timeout=1)
+
+    # workers are terminated rather than left rendering
+    assert perf_counter() - t0 < 30
+    assert multiprocessing.active_children() == []
+
+
+@pytest.mark.benchmark
+def test_iscreen_benchmark():
+    latency = {}
+
+    for n_particle in [10000, 1000000]:
+        impact_run = ImpactRun(n_particle=n_particle)
+
+        for method in ["histogram", "scatter"]:
+            t0 = perf_counter()
+            iscreen(impact_run, screen="OTR2", dpi=150, as_array=True, method=method)
+            latency[(method, n_particle)] = perf_counter() - t0
+
+    print(", ".join(f"{method} {n_particle:,} particles {t*1e3:.0f} ms" for (method, n_particle), t in latency.items()))
+
+    assert latency[("histogram", 1000000)] < latency[("scatter", 1000000)]
+
+
+def _panels(seed=0):
+    # RGBA panels with the shapes rendered at the dashboard dpi
+    rng = np.random.default_rng(seed)
+    shapes = {
+        "main": (1200, 1800),
+        "text": (450, 750),
+        "screen1": (600, 750),
+        "screen2": (600, 750),
+        "screen3_z": (600, 750),
+        "screen3": (600, 750),
+        "cathode": (600, 750),
+    }
+    return {name: rng.integers(0, 256, (h, w, 4), dtype=np.uint8) for name, (h, w) in shapes.items()}
+
+
+def _pil_composite(panels):
+    # PIL paste chain used before compositing into a single array
+    images = {name: Image.fromarray(panel, "RGBA") for name, panel in panels.items()}
+
+    w0, h0 = images["main"].size
+    w1, h1 = images["screen1"].size
+    w2, h2 = images["screen2"].size
+    w3, h3 = images["text"].size
+    w4, h4 = images["screen3_z"].size
+    w99, h99 = images["cathode"].size
+
+    iout = Image.new("RGB", (w0 + w1, h1 + h2 + h3))
+    iout.paste(images["main"], (0, 10))
+    iout.paste(images["cathode"], (0, h0))
+    iout.paste(images["screen1"], (w99, h0))
+    iout.paste(images["screen2"], (w99 + w1, h0))
+    iout.paste(images["text"], (w0, 0))
+    iout.paste(images["screen3_z"], (w0, h3))
+    iout.paste(images["screen3"], (w0, h4 + h3))
+
+    return ImageEnhance.Contrast(iout).enhance(1.2)
+
+
+def test_composite_dashboard():
+    panels = _panels()
+
+    expected = _pil_composite(panels)
+    image = composite_dashboard(panels)
+
+    assert image.mode == expected.mode
+    assert image.size == expected.size
+    np.testing.assert_array_equal(np.asarray(image), np.asarray(expected))
+
+
+def test_dashboard_compress_level():
+    image = composite_dashboard(_panels())
+
+    png = {compress_level: encode_png(image, compress_level=compress_level) for compress_level in [0, 9]}
+    assert len(png[0]) > len(png[9])
+
+    # lossless at any level
+    for data in png.values():
+        np.testing.assert_array_equal(np.asarray(Image.open(io.BytesIO(data))), np.asarray(image))
+
+
+@pytest.mark.benchmark
+def test_composite_dashboard_benchmark():
+    n_repeat = 5
+    panels = _panels()
+
+    t0 = perf_counter()
+    for _ in range(n_repeat):
+        _pil_composite(panels)
+    pil_time = (perf_counter() - t0) / n_repeat
+
+    t0 = perf_counter()
+    for _ in range(n_repeat):
+        composite_dashboard(panels)
+    array_time = (perf_counter() - t0) / n_repeat
+
+    print(f"dashboard composite: PIL paste {pil_time*1e3:.1f} ms, array {array_time*1e3:.1f} ms")
+
+    assert array_time < pil_time
@@ -0,0 +1,175 @@
+import os
+import threading
+from functools import partial
+
+import numpy as np
+from epics_queue import (
+    ChangeDetector,
+    PVSnapshot,
+    RunScheduler,
+    VCCImageFiles,
+    image_block_sums,
+    monitor_callback,
+)
+
+IMAGE_PVNAME = "CAMR:IN20:186:IMAGE"
+SCALAR_PVNAME = "SOLN:IN20:121:BACT"
+
+
+def _image(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 128, 480 * 640).astype(np.int8)
+
+
+def _snapshot_values(pv_snapshot, values, timestamp=1.0):
+    # channel access callbacks as pyepics delivers them
+    callback = partial(monitor_callback, pv_snapshot)
+    for pvname, value in values.items():
+        callback(pvname=pvname, value=value, timestamp=timestamp)
+
+    values, _ = pv_snapshot.snapshot()
+    return values
+
+
+def test_change_detector_deadband():
+    pv_snapshot = PVSnapshot([SCALAR_PVNAME, "CAMR:IN20:186:RESOLUTION.EGU"])
+    detector = ChangeDetector({SCALAR_PVNAME: 0.01}, image_pvnames=[])
+
+    values = _snapshot_values(pv_snapshot, {SCALAR_PVNAME: 0.47, "CAMR:IN20:186:RESOLUTION.EGU": "um/px"})
+    assert detector.changed(values)
+    detector.update(values)
+
+    # noise within the deadband is suppressed
+    assert not detector.changed(_snapshot_values(pv_snapshot, {SCALAR_PVNAME: 0.475}))
+    assert detector.changed(_snapshot_values(pv_snapshot, {SCALAR_PVNAME: 0.49}))
+
+    # PVs without a deadband must match exactly
+    values = _snapshot_values(pv_snapshot, {SCALAR_PVNAME: 0.47, "CAMR:IN20:186:RESOLUTION.EGU": "mm/px"})
+    assert detector.changed(values)
+
+
+def test_change_detector_image():
+    pv_snapshot = PVSnapshot([IMAGE_PVNAME])
+    detector = ChangeDetector({}, image_pvnames=[IMAGE_PVNAME], image_tolerance=1e-2)
+
+    image = _image()
+    detector.update(_snapshot_values(pv_snapshot, {IMAGE_PVNAME: image}))
+
+    # a hot pixel barely moves the block sums
+    noisy = image.copy()
+    noisy[1000] = 127
+    assert not detector.changed(_snapshot_values(pv_snapshot, {IMAGE_PVNAME: noisy}))
+
+    # a moved spot does
+    moved = np.roll(image.reshape(480, 640), 200, axis=1).ravel()
+    moved[: 480 * 320] = 0
+    assert detector.changed(_snapshot_values(pv_snapshot, {IMAGE_PVNAME: moved}))
+
+
+def test_image_block_sums():
+    image = _image()
+    block_sums = image_block_sums(image, n_blocks=256)
+
+    assert block_sums.shape == (256,)
+    assert block_sums.sum() == image.astype(np.float64).sum()
+
+
+def test_run_scheduler_latest_wins():
+    release = threading.Event()
+    finished = threading.Event()
+    ran = []
+
+    def run(parameters):
+        ran.append(parameters)
+        if parameters == "a":
+            release.wait(10)
+        elif parameters == "c":
+            finished.set()
+            raise RuntimeError("run failed")
+
+    scheduler = RunScheduler(run, max_in_flight=1)
+
+    # a runs while b waits, c supersedes b
+    for parameters in ["a", "b", "c"]:
+        scheduler.submit(parameters)
+
+    assert scheduler.queue_depth == 2
+    assert scheduler.dropped == 1
+
+    release.set()
+    assert finished.wait(10)
+    scheduler.shutdown(wait=True)
+
+    assert ran == ["a", "c"]
+    assert scheduler.stats == {
+        "queue_depth": 0, "in_flight": 0, "submitted": 3, "completed": 1, "failed": 1, "dropped": 1
+    }
+
+
+
+def test_vcc_image_files(tmp_path):
+    image_files = VCCImageFiles(tmp_path)
+    image = _image()
+
+    # identical frames of two runs share one file
+    filename = image_files.acquire(image)
+    assert image_files.acquire(image.copy()) == filename
+
+    other_filename = image_files.acquire(_image(1))
+    assert other_filename != filename
+
+    image_files.release(filename)
+    assert os.path.exists(filename)
+
+    # removed with the last run using it
+    image_files.release(filename)
+    assert not os.path.exists(filename)
+    assert os.path.exists(other_filename)
+
+    image_files.release(other_filename)
+    assert os.listdir(tmp_path) == []
+
+    # written again for a later run
+    assert os.path.exists(image_files.acquire(image))
+
+def test_pv_snapshot_consistent():
+    pv_snapshot = PVSnapshot([IMAGE_PVNAME, SCALAR_PVNAME])
+    callback = partial(monitor_callback, pv_snapshot)
+    stop = threading.Event()
+
+    def write():
+        # pyepics fills the same buffer on every callback
+        buffer = np.zeros(480 * 640, dtype=np.int8)
+        n = 0
+        while not stop.is_set():
+            n += 1
+            buffer[:] = n % 128
+            callback(pvname=IMAGE_PVNAME, value=buffer, timestamp=float(n))
+            callback(pvname=SCALAR_PVNAME, value=n, timestamp=float(n))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+
+    try:
+        snapshots = 0
+        while snapshots < 200:
+            snapshot = pv_snapshot.snapshot()
+            if snapshot is None:
+                continue
+            snapshots += 1
+
+            values, _ = snapshot
+            (image, image_timestamp), (scalar, scalar_timestamp) = (
+                pv_snapshot.published[IMAGE_PVNAME], pv_snapshot.published[SCALAR_PVNAME]
+            )
+
+            # each value is the one delivered with its timestamp, even while the buffer is refilled
+            assert np.all(image == int(image_timestamp) % 128)
+            assert scalar == scalar_timestamp
+
+            # the copy is taken between callbacks, never across a swap of either pair
+            assert int(image_timestamp) - scalar in (0, 1)
+            assert values[IMAGE_PVNAME] is image
+    finally:
+        stop.set()
+        writer.join()
@@ -1,10 +1,14 @@
-from lume_distgen_impact_cu_inj.flow import flow, impact_output_variables, archive_file_rep
+from lume_distgen_impact_cu_inj.flow import flow, impact_output_variables, archive_file_rep, cache_key, _pooled_distgen_model, DISTGEN_MODEL_POOL_SIZE, format_low_fidelity_settings
 from datetime import datetime
+import glob
 import os
+import pytest
 import numpy as np
 from lume_distgen_impact_cu_inj import DEFAULT_VCC_ARRAY
+from lume_distgen_impact_cu_inj.cache import ResultCache
+from lume_distgen_impact_cu_inj.dashboard import dashboard_data_filename, render_dashboard
 
-def test_flow_execution(tmp_path):
+def _flow_parameters(tmp_path):
     # format inputs
     dir_path=tmp_path
     vcc_array = DEFAULT_VCC_ARRAY
@@ -69,9 +73,7 @@ def test_flow_execution(tmp_path):
                     "QE04:b1_gradient": -3.20496,
     }
 
-    flow.set_reference_tasks([impact_output_variables])
-
-    flow_run = flow.run(
+    return dict(
         dashboard_dir = dir_path, 
         pv_collection_isotime=pv_collection_isotime, 
         impact_configuration=impact_configuration, 
@@ -84,4 +86,102 @@ def test_flow_execution(tmp_path):
         archive_dir = dir_path,
         **distgen_input_values, **impact_inputs
     )
+
+
+@pytest.mark.parametrize("fidelity_mode", ["full", "progressive"])
+def test_flow_execution(tmp_path, fidelity_mode):
+    flow.set_reference_tasks([impact_output_variables])
+
+    parameters = _flow_parameters(tmp_path)
+    impact_settings = dict(parameters["impact_settings"])
+
+    flow_run = flow.run(fidelity_mode=fidelity_mode, **parameters)
+    assert flow_run.is_successful()
+
+    # fidelity is recorded in the results only, the settings passed in are unchanged
+    assert parameters["impact_settings"] == impact_settings
+
+    # the low-fidelity pass is archived alongside the full run
+    assert len(glob.glob(f"{tmp_path}/*_low.h5")) == (fidelity_mode == "progressive")
+
+
+def test_flow_bad_surrogate(tmp_path):
+    flow.set_reference_tasks([impact_output_variables])
+
+    surrogate_file = tmp_path / "surrogate.npz"
+    surrogate_file.write_bytes(b"not a surrogate")
+
+    # the simulation runs without a preview
+    for filename in [surrogate_file, tmp_path / "missing.npz"]:
+        flow_run = flow.run(surrogate_file=str(filename), surrogate_dir=str(tmp_path), **_flow_parameters(tmp_path))
+        assert flow_run.is_successful()
+        assert glob.glob(f"{tmp_path}/*.surrogate.json") == []
+
+
+def test_flow_deferred_dashboard(tmp_path):
+    flow.set_reference_tasks([archive_file_rep])
+
+    flow_run = flow.run(dashboard_mode="deferred", **_flow_parameters(tmp_path))
     assert flow_run.is_successful()
+
+    # stored with the archive and rendered from it on request
+    archive_file, = glob.glob(f"{tmp_path}/*.h5")
+    assert os.path.exists(dashboard_data_filename(archive_file))
+    assert glob.glob(f"{tmp_path}/*.png") == []
+
+    assert os.path.getsize(render_dashboard(archive_file)) > 0
+
+
+def test_flow_result_cache(tmp_path):
+    parameters = _flow_parameters(tmp_path)
+    result_cache_dir = str(tmp_path / "results")
+
+    flow.set_reference_tasks([cache_key])
+
+    keys = []
+    for _ in range(2):
+        flow_run = flow.run(result_cache_dir=result_cache_dir, **parameters)
+        assert flow_run.is_successful()
+        keys.append(flow_run.result[cache_key].result)
+
+    # the second run is served from the cache
+    assert keys[0] == keys[1]
+    assert ResultCache(result_cache_dir).stats["hits"] == 1
+
+    # approximate particles or another distgen configuration are not served for the stored key
+    for changed in [{"image_tolerance": 0.05}, {"distgen_configuration": {"workdir": str(tmp_path)}}]:
+        flow_run = flow.run(result_cache_dir=result_cache_dir, **{**parameters, **changed})
+        assert flow_run.is_successful()
+        assert flow_run.result[cache_key].result not in keys
+
+    stats = ResultCache(result_cache_dir).stats
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+
+
+def test_pooled_distgen_model():
+    model, lock = _pooled_distgen_model("pooled", object)
+    assert _pooled_distgen_model("pooled", object) == (model, lock)
+
+    # least recently used models are dropped
+    for i in range(DISTGEN_MODEL_POOL_SIZE):
+        _pooled_distgen_model(i, object)
+
+    assert _pooled_distgen_model("pooled", object)[0] is not model
+
+
+def test_format_low_fidelity_settings():
+    impact_settings = {"header:Nx": 32, "header:Dt": 1e-12, "change_timestep_1:dt": 5e-12}
+
+    distgen_settings, low_impact_settings = format_low_fidelity_settings.run({"n_particle": 10000}, impact_settings)
+    assert distgen_settings["n_particle"] == 1000
+    assert low_impact_settings["header:Nx"] == 8
+
+    # timesteps scale those of the full-fidelity run
+    assert low_impact_settings["header:Dt"] == 4e-12
+    assert low_impact_settings["change_timestep_1:dt"] == 2e-11
+
+    # explicit overrides win
+    _, low_impact_settings = format_low_fidelity_settings.run({}, impact_settings, {"impact": {"header:Dt": 3e-12}})
+    assert low_impact_settings["header:Dt"] == 3e-12
+    assert low_impact_settings["change_timestep_1:dt"] == 2e-11
@@ -0,0 +1,60 @@
+import re
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from lume_distgen_impact_cu_inj import CU_INJ_MAPPING_TABLE, IMPACT_INPUT_VARIABLES, DISTGEN_OUTPUT_VARIABLES
+from lume_distgen_impact_cu_inj.metadata import IMPACT_FACTORS, DEVICE_RANGES, IMPACT_INPUT_NAMES, DISTGEN_OUTPUT_NAMES
+
+# cumulative import time allowed for modules that must stay lightweight, checked
+# by the opt-in benchmark as it depends on the machine
+IMPORT_TIME_THRESHOLD = 0.5
+
+HEAVY_MODULES = {"pandas", "lume_model", "distgen", "impact", "matplotlib", "skimage"}
+
+
+def _import_time(module):
+    """
+    Cumulative import time of module in seconds measured with python -X importtime
+    in a fresh interpreter, along with the modules it loaded
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$", result.stderr, re.MULTILINE)
+    return int(match.group(1)) / 1e6, set(result.stdout.split())
+
+
+@pytest.mark.parametrize("module", ["lume_distgen_impact_cu_inj", "lume_distgen_impact_cu_inj.metadata"])
+def test_import_modules(module):
+    _, modules = _import_time(module)
+
+    assert not HEAVY_MODULES & modules
+
+    # the metadata files are parsed on first use
+    if module == "lume_distgen_impact_cu_inj":
+        assert "lume_distgen_impact_cu_inj.metadata" not in modules
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("module", ["lume_distgen_impact_cu_inj", "lume_distgen_impact_cu_inj.metadata"])
+def test_import_time(module, record_property):
+    import_time, _ = _import_time(module)
+
+    record_property("import_ms", round(import_time * 1e3, 1))
+
+    assert import_time < IMPORT_TIME_THRESHOLD
+
+
+def test_metadata():
+    assert IMPACT_INPUT_NAMES == tuple(IMPACT_INPUT_VARIABLES)
+    assert DISTGEN_OUTPUT_NAMES == tuple(DISTGEN_OUTPUT_VARIABLES)
+
+    assert dict(IMPACT_FACTORS) == dict(zip(CU_INJ_MAPPING_TABLE["impact_name"], CU_INJ_MAPPING_TABLE["impact_factor"]))
+
+    for pv_name, device_min, device_max in CU_INJ_MAPPING_TABLE[["device_pv_name", "device_min", "device_max"]].itertuples(index=False):
+        np.testing.assert_array_equal(DEVICE_RANGES[pv_name], (device_min, device_max))
@@ -0,0 +1,237 @@
+import tracemalloc
+from copy import deepcopy
+from time import perf_counter
+
+import numpy as np
+import pytest
+from lume_distgen_impact_cu_inj import DISTGEN_INPUT_VARIABLES
+from lume_distgen_impact_cu_inj.files import IMPACT_ARCHIVE_FILE, DISTGEN_INPUT_FILE
+from lume_distgen_impact_cu_inj.cache import ParticleCache
+import lume_distgen_impact_cu_inj.model
+from lume_distgen_impact_cu_inj.model import ImpactPool, ImpactModel, DistgenModel, LUMEConfiguration, ExecutionPlanner, load_distgen_input, PARTICLE_KEYS
+
+
+def test_impact_pool(tmp_path):
+    configuration = {"command": "ImpactTexe", "workdir": str(tmp_path)}
+    base_settings = {"header:Nx": 16}
+
+    pool = ImpactPool(max_size=1)
+
+    I1 = pool.get(IMPACT_ARCHIVE_FILE, configuration, base_settings)
+    I2 = pool.get(IMPACT_ARCHIVE_FILE, configuration, base_settings)
+
+    assert pool.stats["hits"] == 1
+    assert pool.stats["misses"] == 1
+
+    # copies are independent and run in their own directories
+    assert I1 is not I2
+    assert I1.path != I2.path
+    assert I2.header["Nx"] == 16
+
+    I2["SOL1:solenoid_field_scale"] = 0.1
+    assert I1["SOL1:solenoid_field_scale"] != 0.1
+
+    # a different configuration replaces the template
+    pool.get(IMPACT_ARCHIVE_FILE, configuration, {"header:Nx": 32})
+    assert pool.stats["size"] == 1
+    assert pool.stats["evictions"] == 1
+
+    # values are read from the template without a copy
+    assert pool.values(IMPACT_ARCHIVE_FILE, ["header:Nx"], configuration, {"header:Nx": 32}) == {"header:Nx": 32}
+    assert pool.stats["hits"] == 2
+
+    pool.clear()
+    assert pool.stats["size"] == 0
+
+
+def _distgen_input_variables():
+    input_variables = deepcopy(DISTGEN_INPUT_VARIABLES)
+    input_variables["vcc_array"].value = input_variables["vcc_array"].default
+    input_variables["vcc_size_y"].value = 480
+    input_variables["vcc_size_x"].value = 640
+    input_variables["vcc_resolution"].value = 9
+    input_variables["vcc_resolution_units"].value = "um"
+    input_variables["total_charge"].value = 250
+    return input_variables
+
+
+def test_load_distgen_input():
+    distgen_input = load_distgen_input(DISTGEN_INPUT_FILE)
+    distgen_input["n_particle"] = 1
+
+    # callers get a copy
+    assert load_distgen_input(DISTGEN_INPUT_FILE)["n_particle"] != 1
+
+
+def test_distgen_evaluate_benchmark(tmp_path):
+    n_repeat = 3
+    input_variables = _distgen_input_variables()
+    settings = {"n_particle": 10000}
+    timing = {}
+    outputs = {}
+
+    for reuse_generator in [False, True]:
+        model = DistgenModel(
+            input_file=DISTGEN_INPUT_FILE,
+            configuration=LUMEConfiguration(),
+            distgen_output_filename=f"{tmp_path}/laser.txt",
+            reuse_generator=reuse_generator,
+        )
+
+        t0 = perf_counter()
+        for _ in range(n_repeat):
+            output_variables = model.evaluate(input_variables, settings=settings)
+        timing[reuse_generator] = (perf_counter() - t0) / n_repeat
+        outputs[reuse_generator] = np.copy(output_variables["x"].value)
+
+    print(f"DistgenModel.evaluate: new generator {timing[False]:.3f} s, reused generator {timing[True]:.3f} s")
+
+    # hammersley sampling is deterministic
+    np.testing.assert_allclose(outputs[True], outputs[False])
+
+
+def test_distgen_evaluate_batch(tmp_path):
+    model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(workdir=str(tmp_path)),
+        distgen_output_filename=f"{tmp_path}/laser.txt",
+    )
+
+    inputs = {var_name: var.value for var_name, var in _distgen_input_variables().items()}
+    list_of_inputs = [{**inputs, "total_charge": total_charge} for total_charge in [100, 200]]
+
+    results = model.evaluate_batch(list_of_inputs, settings={"n_particle": 1000}, max_workers=2)
+
+    assert list(results.columns) == list(DistgenModel.output_variables)
+    assert len(results) == 2
+    np.testing.assert_allclose(results["weight"][1].sum(), 2 * results["weight"][0].sum())
+
+
+# the 1M particle measurement is opt-in, reported in the measurements summary
+@pytest.mark.parametrize("n_particle", [10000, pytest.param(1000000, marks=pytest.mark.slow)])
+def test_distgen_particle_handoff(tmp_path, record_property, n_particle):
+    model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(),
+        distgen_output_filename=f"{tmp_path}/laser.txt",
+    )
+
+    tracemalloc.start()
+    t0 = perf_counter()
+    output_variables = model.evaluate(_distgen_input_variables(), settings={"n_particle": n_particle})
+    run_time = perf_counter() - t0
+    particles = model.particles
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    particle_bytes = sum(particles._data[key].nbytes for key in PARTICLE_KEYS if key != "species")
+
+    record_property("evaluate_s", round(run_time, 2))
+    record_property("peak_mb", round(peak / 1e6))
+    record_property("particle_arrays_mb", round(particle_bytes / 1e6))
+
+    assert particles.n_particle == n_particle
+
+    # outputs are views of the handed off particles
+    for key in PARTICLE_KEYS:
+        if key != "species":
+            assert np.shares_memory(output_variables[key].value, particles._data[key])
+
+
+def test_distgen_particle_cache(tmp_path):
+    cache = ParticleCache(tmp_path / "particles", max_entries=2)
+    model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(),
+        distgen_output_filename=f"{tmp_path}/laser.txt",
+        particle_cache=cache,
+    )
+    input_variables = _distgen_input_variables()
+    settings = {"n_particle": 10000}
+
+    generated = np.copy(model.evaluate(input_variables, settings=settings)["x"].value)
+    cached = model.evaluate(input_variables, settings=settings)["x"].value
+
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+    np.testing.assert_array_equal(cached, generated)
+
+    # a charge change regenerates
+    input_variables["total_charge"].value = 100
+    model.evaluate(input_variables, settings=settings)
+    assert cache.stats["misses"] == 2
+
+
+def test_distgen_particle_cache_image_tolerance(tmp_path):
+    cache = ParticleCache(tmp_path / "particles", max_entries=2)
+    model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(),
+        distgen_output_filename=f"{tmp_path}/laser.txt",
+        particle_cache=cache,
+        image_tolerance=0.05,
+    )
+    input_variables = _distgen_input_variables()
+    settings = {"n_particle": 10000}
+
+    model.evaluate(input_variables, settings=settings)
+
+    # a frame with camera noise reuses the particles
+    rng = np.random.default_rng(0)
+    vcc_array = input_variables["vcc_array"].value
+    input_variables["vcc_array"].value = np.clip(vcc_array + rng.normal(0, 2, vcc_array.shape).round(), 0, 255).astype(vcc_array.dtype)
+    model.evaluate(input_variables, settings=settings)
+
+    assert cache.stats["hits"] == 1
+
+
+def test_distgen_particle_cache_small_spot(tmp_path):
+    cache = ParticleCache(tmp_path / "particles", max_entries=2)
+    model = DistgenModel(
+        input_file=DISTGEN_INPUT_FILE,
+        configuration=LUMEConfiguration(),
+        distgen_output_filename=f"{tmp_path}/laser.txt",
+        particle_cache=cache,
+        image_tolerance=0.05,
+    )
+    input_variables = _distgen_input_variables()
+    settings = {"n_particle": 10000}
+
+    # a spot isolated to fewer pixels than the fingerprint grid
+    vcc_array = np.zeros((480, 640), dtype=np.int8)
+    vcc_array[200:216, 300:318] = 100
+    input_variables["vcc_array"].value = vcc_array.ravel()
+
+    model.evaluate(input_variables, settings=settings)
+    model.evaluate(input_variables, settings=settings)
+
+    assert cache.stats["hits"] == 1
+
+
+def test_execution_planner(tmp_path, monkeypatch):
+    monkeypatch.setattr(lume_distgen_impact_cu_inj.model, "available_cores", lambda: 8)
+    planner = ExecutionPlanner(str(tmp_path / "scaling.jsonl"))
+    grid = (32, 32, 32)
+
+    assert ExecutionPlanner.processor_domain(4, 32, 32) == (2, 2)
+    assert ExecutionPlanner.processor_domain(6, 32, 32) == (2, 3)
+
+    # bounded by cores, then by particles per process
+    assert planner.plan(10000, grid) == {"numprocs": 8, "header:Nprow": 2, "header:Npcol": 4}
+    assert planner.plan(2000, grid)["numprocs"] == 2
+
+    # halves while fewer processes are faster, then keeps the fastest
+    planner.record(10000, grid, 8, 100.0)
+    assert planner.plan(10000, grid)["numprocs"] == 4
+    planner.record(10000, grid, 4, 80.0)
+    assert planner.plan(10000, grid)["numprocs"] == 2
+    planner.record(10000, grid, 2, 90.0)
+    assert planner.plan(10000, grid)["numprocs"] == 4
+
+    # measurements are per problem size
+    assert planner.plan(10000, (16, 16, 16))["numprocs"] == 8
+
+    # planned runs need an MPI build
+    with pytest.raises(ValueError):
+        ImpactModel(archive_file=IMPACT_ARCHIVE_FILE, configuration=LUMEConfiguration(command="ImpactTexe"), planner=planner)
+
@@ -0,0 +1,57 @@
+from copy import deepcopy
+from time import perf_counter
+
+import numpy as np
+import pytest
+from lume_distgen_impact_cu_inj import CU_INJ_MAPPING_TABLE, IMPACT_INPUT_VARIABLES
+from lume_distgen_impact_cu_inj.flow import impact_preprocessing_task
+
+
+def _table_preprocessing(input_variables):
+    # per-variable table scan used before the precomputed factors
+    for var_name, variable in input_variables.items():
+        if CU_INJ_MAPPING_TABLE["impact_name"].str.contains(var_name, regex=False).any():
+            variable.value = (
+                variable.value
+                * CU_INJ_MAPPING_TABLE.loc[
+                    CU_INJ_MAPPING_TABLE["impact_name"] == var_name, "impact_factor"
+                ].item()
+            )
+
+    return input_variables
+
+
+def _input_variables():
+    input_variables = deepcopy(IMPACT_INPUT_VARIABLES)
+    for i, variable in enumerate(input_variables.values()):
+        variable.value = i + 0.5
+
+    return input_variables
+
+
+def test_impact_preprocessing():
+    expected = _table_preprocessing(_input_variables())
+    scaled = impact_preprocessing_task.run(_input_variables())
+
+    for var_name, variable in expected.items():
+        np.testing.assert_allclose(scaled[var_name].value, variable.value)
+
+
+@pytest.mark.benchmark
+def test_impact_preprocessing_benchmark():
+    n_repeat = 20
+    inputs = [_input_variables() for _ in range(2 * n_repeat)]
+
+    t0 = perf_counter()
+    for input_variables in inputs[:n_repeat]:
+        _table_preprocessing(input_variables)
+    table_time = (perf_counter() - t0) / n_repeat
+
+    t0 = perf_counter()
+    for input_variables in inputs[n_repeat:]:
+        impact_preprocessing_task.run(input_variables)
+    factor_time = (perf_counter() - t0) / n_repeat
+
+    print(f"impact_preprocessing_task: table scan {table_time*1e3:.3f} ms, factors {factor_time*1e3:.3f} ms")
+
+    assert factor_time < table_time
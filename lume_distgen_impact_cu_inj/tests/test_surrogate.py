@@ -0,0 +1,89 @@
+from copy import deepcopy
+from time import perf_counter
+
+import numpy as np
+from lume_distgen_impact_cu_inj import IMPACT_INPUT_VARIABLES, IMPACT_OUTPUT_VARIABLES
+from lume_distgen_impact_cu_inj.surrogate import SurrogateImpactModel
+
+# in variables.yml order
+OUTPUT_NAMES = ["end_sigma_x", "end_norm_emit_x"]
+
+
+def _inputs(n_sample, seed):
+    rng = np.random.default_rng(seed)
+    value_range = np.array([var.value_range for var in IMPACT_INPUT_VARIABLES.values()], dtype=float)
+    return value_range[:, 0] + np.ptp(value_range, axis=1) * rng.random((n_sample, len(value_range)))
+
+
+def _outputs(X):
+    # smooth stand-in for Impact over the solenoid, cavity and quad inputs
+    value_range = np.array([var.value_range for var in IMPACT_INPUT_VARIABLES.values()], dtype=float)
+    u = (X - value_range[:, 0]) / np.ptp(value_range, axis=1)
+    return np.stack(
+        [
+            1e-3 * np.exp(-u[:, 0]) * (1 + u[:, 8]),
+            1e-6 * (1 + np.sin(3 * u[:, 0]) + u[:, 7] ** 2 + 0.5 * u[:, 3] * u[:, 5]),
+        ],
+        axis=1,
+    )
+
+
+def _results(n_sample, seed):
+    X = _inputs(n_sample, seed)
+    return [
+        {"inputs": dict(zip(IMPACT_INPUT_VARIABLES, x)), "outputs": dict(zip(OUTPUT_NAMES, y))}
+        for x, y in zip(X.tolist(), _outputs(X).tolist())
+    ]
+
+
+def test_surrogate_impact_model(tmp_path):
+    model = SurrogateImpactModel.from_results(_results(500, 0))
+    assert model.output_names == OUTPUT_NAMES
+
+    X = _inputs(200, 1)
+    expected = _outputs(X)
+    mean, std = model.predict(X)
+
+    rmse = np.sqrt(np.mean((mean - expected) ** 2, axis=0))
+    assert np.all(rmse < 0.1 * expected.std(axis=0))
+    assert np.all(std > 0)
+
+    # round trip through the flow's surrogate_file
+    loaded = SurrogateImpactModel.load(model.save(str(tmp_path / "surrogate.npz")))
+    np.testing.assert_array_equal(loaded.predict(X)[0], mean)
+
+    # same interface as ImpactModel.evaluate
+    input_variables = deepcopy(IMPACT_INPUT_VARIABLES)
+    for variable, val in zip(input_variables.values(), X[0].tolist()):
+        variable.value = val
+
+    t0 = perf_counter()
+    output_variables = loaded.evaluate(list(input_variables.values()), None)
+    latency = perf_counter() - t0
+
+    print(f"SurrogateImpactModel.evaluate: {latency*1e3:.2f} ms")
+
+    for var_name, val in zip(OUTPUT_NAMES, mean[0]):
+        np.testing.assert_allclose(output_variables[var_name].value, val)
+        assert IMPACT_OUTPUT_VARIABLES[var_name].value != val
+    assert set(loaded.uncertainty) == set(OUTPUT_NAMES)
+    assert latency < 1
+
+
+def test_surrogate_training_results():
+    results = _results(100, 0)
+
+    # stored cache hits repeat earlier results
+    model = SurrogateImpactModel.from_results(results)
+    repeated = SurrogateImpactModel.from_results(results + results[:50])
+
+    # low-fidelity results of the progressive mode are not trained on
+    low = [
+        {"inputs": {**result["inputs"], "fidelity": "low"}, "outputs": {var_name: 0.0 for var_name in OUTPUT_NAMES}}
+        for result in _results(50, 2)
+    ]
+    filtered = SurrogateImpactModel.from_results(results + low)
+
+    X = _inputs(20, 1)
+    np.testing.assert_allclose(repeated.predict(X)[0], model.predict(X)[0], rtol=1e-6)
+    np.testing.assert_array_equal(filtered.predict(X)[0], model.predict(X)[0])
@@ -0,0 +1,190 @@
+import os
+import json
+import pickle
+from time import perf_counter
+
+import numpy as np
+import pytest
+from lume_distgen_impact_cu_inj import DEFAULT_VCC_ARRAY
+from pmd_beamphysics import ParticleGroup
+from lume_distgen_impact_cu_inj.utils import (
+    save_vcc_array,
+    load_vcc_array,
+    isolate_image,
+    save_particles,
+    image_distance,
+    image_fingerprint,
+    fingerprint_distance,
+    PARTICLE_KEYS,
+)
+
+
+def test_vcc_array_file_transport(tmp_path):
+    filename = save_vcc_array(DEFAULT_VCC_ARRAY, tmp_path)
+
+    # content addressed
+    assert save_vcc_array(DEFAULT_VCC_ARRAY.copy(), tmp_path) == filename
+
+    loaded = load_vcc_array(filename)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, DEFAULT_VCC_ARRAY)
+
+
+@pytest.mark.benchmark
+def test_vcc_array_transport_benchmark(tmp_path, record_property):
+    n_repeat = 5
+
+    # JSON list parameter: tolist in the callback, serialized by Prefect, rebuilt in preprocessing
+    t0 = perf_counter()
+    for _ in range(n_repeat):
+        parameter = json.dumps(DEFAULT_VCC_ARRAY.tolist())
+        np.array(json.loads(parameter)).astype(np.int8)
+    list_time = (perf_counter() - t0) / n_repeat
+
+    # file parameter: serialized path, memory-mapped in preprocessing
+    # use a fresh directory per repeat so each frame is actually written
+    directories = [tmp_path / str(i) for i in range(n_repeat)]
+    for directory in directories:
+        directory.mkdir()
+
+    t0 = perf_counter()
+    for directory in directories:
+        parameter = json.dumps(save_vcc_array(DEFAULT_VCC_ARRAY, directory))
+        load_vcc_array(json.loads(parameter)).astype(np.int8)
+    file_time = (perf_counter() - t0) / n_repeat
+
+    record_property("list_ms", round(list_time * 1e3, 2))
+    record_property("file_ms", round(file_time * 1e3, 2))
+
+    assert file_time < list_time
+
+
+# flow preprocessing downcasts to int8
+@pytest.mark.parametrize("dtype", [np.uint8, np.int8])
+def test_isolate_image_rank_count(dtype):
+    image = DEFAULT_VCC_ARRAY.astype(dtype).reshape(480, 640)
+
+    expected = isolate_image(image, method="watershed")
+    cutimg = isolate_image(image, method="rank_count")
+
+    assert cutimg.dtype == expected.dtype
+    np.testing.assert_array_equal(cutimg, expected)
+
+    # reused work buffers must not leak into returned images
+    isolate_image(np.flip(image), method="rank_count")
+    np.testing.assert_array_equal(cutimg, expected)
+
+
+@pytest.mark.benchmark
+def test_isolate_image_benchmark(record_property):
+    n_repeat = 10
+    image = DEFAULT_VCC_ARRAY.reshape(480, 640)
+    latency = {}
+
+    for method in ["watershed", "rank_count"]:
+        # warm up buffers
+        isolate_image(image, method=method)
+
+        t0 = perf_counter()
+        for _ in range(n_repeat):
+            isolate_image(image, method=method)
+        latency[method] = (perf_counter() - t0) / n_repeat
+
+    for method, t in latency.items():
+        record_property(f"{method}_ms", round(t * 1e3, 2))
+
+    assert latency["rank_count"] < latency["watershed"]
+
+
+def _particle_group(n_particle):
+    rng = np.random.default_rng(0)
+    data = {key: rng.normal(size=n_particle) for key in ["x", "px", "y", "py", "z", "pz", "t"]}
+    data.update(status=np.ones(n_particle, dtype=int), weight=np.full(n_particle, 1e-16), species="electron")
+    return ParticleGroup(data=data)
+
+
+def test_particle_file(tmp_path):
+    particle_group = _particle_group(100000)
+    particle_file = save_particles(particle_group, tmp_path)
+
+    # only the reference crosses task boundaries
+    transferred = pickle.loads(pickle.dumps(particle_file))
+    assert len(pickle.dumps(particle_file)) < 1000
+
+    loaded = transferred.load()
+    assert loaded is transferred.load()
+    for key in PARTICLE_KEYS:
+        np.testing.assert_array_equal(loaded[key], particle_group[key])
+
+    # corrupted files are rejected
+    particle_group.x[0] += 1
+    particle_group.write(particle_file.filename)
+
+    with pytest.raises(ValueError):
+        pickle.loads(pickle.dumps(particle_file)).load()
+
+    # each handoff owns its file, removed once loaded
+    other_file = save_particles(particle_group, tmp_path)
+    assert other_file.filename != save_particles(particle_group, tmp_path).filename
+
+    other_file.load()
+    other_file.remove()
+    assert not os.path.exists(other_file.filename)
+    assert other_file.load() is not None
+
+
+@pytest.mark.benchmark
+def test_particle_handoff_benchmark(tmp_path, record_property):
+    particle_group = _particle_group(1000000)
+
+    t0 = perf_counter()
+    payload = pickle.dumps(particle_group)
+    pickle.loads(payload)
+    group_time = perf_counter() - t0
+
+    t0 = perf_counter()
+    particle_file = save_particles(particle_group, tmp_path)
+    file_payload = pickle.dumps(particle_file)
+    pickle.loads(file_payload).load()
+    file_time = perf_counter() - t0
+
+    # at 1M particles, the file time includes its write and read
+    record_property("group_mb", round(len(payload) / 1e6))
+    record_property("group_ms", round(group_time * 1e3))
+    record_property("file_bytes", len(file_payload))
+    record_property("file_ms", round(file_time * 1e3))
+
+    assert len(file_payload) < len(payload) / 1000
+
+
+def test_image_distance():
+    rng = np.random.default_rng(0)
+    image = DEFAULT_VCC_ARRAY.reshape(480, 640)
+    isolated = isolate_image(image, method="rank_count")
+
+    # camera noise of a few counts
+    noisy = np.clip(image + rng.normal(0, 2, image.shape).round(), 0, 255).astype(np.uint8)
+    noise_distance = image_distance(isolated, isolate_image(noisy, method="rank_count"))
+
+    # a dimmer half of the laser spot
+    dimmed = image.astype(float)
+    dimmed[:, :320] *= 0.8
+    change_distance = image_distance(isolated, isolate_image(dimmed.astype(np.uint8), method="rank_count"))
+
+    print(f"image_distance: noise {noise_distance:.3f}, dimmed half {change_distance:.3f}")
+
+    assert image_distance(isolated, isolated) == 0
+    assert noise_distance < 0.05 < change_distance
+
+
+def test_image_fingerprint_small_roi():
+    # a tightly isolated spot smaller than the fingerprint grid
+    spot = np.zeros((12, 40))
+    spot[4:8, 10:30] = 100
+
+    fingerprint = image_fingerprint(spot)
+    assert fingerprint["roi"].shape == (12, 32)
+    assert fingerprint_distance(fingerprint, image_fingerprint(spot.copy())) == 0
+
+    # small spots of another size never match
+    assert fingerprint_distance(fingerprint, image_fingerprint(spot[:10])) == np.inf
@@ -4,17 +4,114 @@ from skimage.util import img_as_ubyte
 from skimage.segmentation import watershed
 from skimage.filters.rank import median
 from skimage.morphology import disk
+from scipy import ndimage
 import os
+import hashlib
+import tempfile
+import threading
 import pint
+from pmd_beamphysics import ParticleGroup
+from lume_distgen_impact_cu_inj.vcc import save_vcc_array, load_vcc_array
 
-def write_distgen_xy_dist(filename, image, resolution, resolution_units='m'):
+# particle data handed from distgen to Impact
+PARTICLE_KEYS = ("x", "px", "y", "py", "z", "pz", "t", "status", "weight", "species")
+
+
+def _particle_checksum(data):
+    digest = hashlib.blake2b(digest_size=16)
+    for key in PARTICLE_KEYS:
+        if key == "species":
+            digest.update(str(data[key]).encode())
+        else:
+            digest.update(np.ascontiguousarray(data[key]).tobytes())
+    return digest.hexdigest()
+
+
+class ParticleFile:
+    """
+    Particles spilled to disk by save_particles. Only the path and checksum are
+    pickled, so it can be passed between flow tasks on distributed executors in
+    place of the particle arrays. The file is read and verified on first load.
+    """
+
+    def __init__(self, filename, checksum):
+        self.filename = filename
+        self.checksum = checksum
+        self._particles = None
+
+    def __getstate__(self):
+        return {"filename": self.filename, "checksum": self.checksum}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return f"ParticleFile({self.filename!r}, {self.checksum!r})"
+
+    def load(self):
+        """
+        Returns the ParticleGroup, cached after the first call
+        """
+        if self._particles is None:
+            particles = ParticleGroup(h5=self.filename)
+
+            if _particle_checksum(particles._data) != self.checksum:
+                raise ValueError(f"Checksum mismatch for particle file {self.filename}")
+
+            self._particles = particles
+
+        return self._particles
+
+    def remove(self):
+        """
+        Deletes the file, loaded particles stay available
+        """
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+
+def save_particles(particle_group, directory):
+    """
+    Writes particles in openPMD HDF5 format to a new file in directory, named
+    by a hash of their contents and a unique suffix so that each handoff owns
+    its file and can remove it once read.
+
+    Returns a ParticleFile referencing the absolute path written
+    """
+    checksum = _particle_checksum(particle_group._data)
+
+    # the path is only handed off once the write completes
+    fd, filename = tempfile.mkstemp(dir=directory, prefix=f"particles_{checksum}_", suffix=".h5")
+    os.close(fd)
+    try:
+        particle_group.write(filename)
+    except BaseException:
+        os.remove(filename)
+        raise
+
+    return ParticleFile(os.path.abspath(filename), checksum)
+
+
+def load_particles(particles):
+    """
+    Returns a ParticleGroup from either a ParticleGroup or a ParticleFile
+    """
+    if isinstance(particles, ParticleFile):
+        return particles.load()
+
+    return particles
+
+
+def write_distgen_xy_dist(filename, image, resolution, resolution_units='m', isolation_method="watershed"):
     """
     Writes image data in distgen's xy_dist format
     
     Returns the absolute path to the file written
     
     """
-    image = isolate_image(image)
+    image = isolate_image(image, method=isolation_method)
     # Get width of each dimension
     widths = resolution * np.array(image.shape)
     
@@ -32,14 +129,14 @@ y {widths[0]} {center_y}  [{resolution_units}]"""
 
 
 
-def format_distgen_xy_dist(image, resolution, resolution_units):
+def format_distgen_xy_dist(image, resolution, resolution_units, isolation_method="watershed"):
     """
     Writes image data in distgen's xy_dist format
     
     Returns the absolute path to the file written
     
     """
-    image = isolate_image(image)
+    image = isolate_image(image, method=isolation_method)
 
     ureg = pint.UnitRegistry()
     
@@ -69,7 +166,7 @@ def format_distgen_xy_dist(image, resolution, resolution_units):
 
 
 
-def isolate_image(img, fclip=0.08):
+def _isolate_watershed(img, fclip=0.08):
     """
     Uses a masking technique to isolate the VCC image
     """
@@ -103,3 +200,184 @@ def isolate_image(img, fclip=0.08):
     cutimg = img[i0:i1,j0:j1]
     
     return cutimg
+
+
+class _RankCountBuffers:
+    """
+    Work buffers for _isolate_rank_count, allocated once per image shape and dtype
+    """
+
+    FOOTPRINT = disk(2).astype(np.int32)
+
+    def __init__(self, shape, dtype):
+        self.work = np.empty(shape, dtype=dtype)
+        self.nonzero = np.empty(shape, dtype=np.int32)
+        self.count = np.empty(shape, dtype=np.int32)
+        self.mask = np.empty(shape, dtype=bool)
+
+        # number of footprint pixels inside the image, the median at the border
+        # is taken over these only
+        self.valid = ndimage.correlate(np.ones(shape, dtype=np.int32), self.FOOTPRINT, mode="constant")
+
+
+_rank_count_buffers = threading.local()
+
+
+def _get_rank_count_buffers(shape, dtype):
+    cache = getattr(_rank_count_buffers, "cache", None)
+    if cache is None:
+        cache = _rank_count_buffers.cache = {}
+
+    key = (shape, np.dtype(dtype).str)
+    if key not in cache:
+        cache[key] = _RankCountBuffers(shape, dtype)
+
+    return cache[key]
+
+
+def _isolate_rank_count(img, fclip=0.08):
+    """
+    Isolates the VCC image with the same result as the watershed method.
+
+    The watershed markers cover every pixel, so the segmentation reduces to the
+    disk(2) median mask being nonzero. That median is nonzero exactly when at
+    least half of the footprint pixels inside the image are nonzero, which is
+    computed here with a single integer count filter in preallocated buffers.
+    """
+    img = np.asarray(img)
+    buffers = _get_rank_count_buffers(img.shape, img.dtype)
+    work = buffers.work
+
+    # Clip lowest fclip fraction
+    np.copyto(work, img)
+    np.less(work, np.max(work) * fclip, out=buffers.mask)
+    work[buffers.mask] = 0
+
+    # nonzero pixels after conversion to ubyte, as seen by the rank median
+    if work.dtype == np.uint8:
+        np.not_equal(work, 0, out=buffers.mask)
+    elif work.dtype == np.int8:
+        np.greater(work, 0, out=buffers.mask)
+    else:
+        np.greater(img_as_ubyte(work), 0, out=buffers.mask)
+
+    np.copyto(buffers.nonzero, buffers.mask)
+    ndimage.correlate(buffers.nonzero, buffers.FOOTPRINT, output=buffers.count, mode="constant")
+
+    # median mask: 2 * count >= valid
+    np.multiply(buffers.count, 2, out=buffers.count)
+    np.greater_equal(buffers.count, buffers.valid, out=buffers.mask)
+
+    # Set to zero in original image
+    np.multiply(work, buffers.mask, out=work, casting="unsafe")
+
+    ixnonzero0 = np.flatnonzero(buffers.mask.any(axis=1))
+    ixnonzero1 = np.flatnonzero(buffers.mask.any(axis=0))
+
+    i0, i1, j0, j1 = ixnonzero0[0], ixnonzero0[-1], ixnonzero1[0], ixnonzero1[-1]
+
+    # copy out of the work buffer, which is reused by the next call
+    return work[i0:i1,j0:j1].copy()
+
+
+ISOLATION_METHODS = {
+    "watershed": _isolate_watershed,
+    "rank_count": _isolate_rank_count,
+}
+
+
+def isolate_image(img, fclip=0.08, method="watershed"):
+    """
+    Isolates the VCC image using the named method from ISOLATION_METHODS.
+
+    "watershed" segments a median-filtered image with skimage's watershed.
+    "rank_count" computes the same region with a count filter over
+    preallocated buffers and is much faster per frame.
+    """
+    try:
+        isolate = ISOLATION_METHODS[method]
+    except KeyError:
+        raise ValueError(f"Unknown isolation method {method}, choose from {list(ISOLATION_METHODS)}.")
+
+    return isolate(img, fclip=fclip)
+
+
+# downsampled grid of image fingerprints
+FINGERPRINT_SHAPE = (32, 32)
+
+
+def _downsample(image, shape):
+    # block means over a grid covering the whole image, normalized to a peak of 1
+    rows = np.linspace(0, image.shape[0], shape[0] + 1).astype(int)
+    cols = np.linspace(0, image.shape[1], shape[1] + 1).astype(int)
+
+    sums = np.add.reduceat(np.add.reduceat(np.asarray(image, dtype=float), rows[:-1], axis=0), cols[:-1], axis=1)
+    blocks = sums / np.outer(np.diff(rows), np.diff(cols))
+
+    peak = blocks.max()
+    return blocks / peak if peak > 0 else blocks
+
+
+def _moments(image):
+    # centroid and rms size in pixels, as x, y, sigma_x, sigma_y
+    image = np.asarray(image, dtype=float)
+    total = image.sum()
+    if total == 0:
+        return np.zeros(4)
+
+    py = image.sum(axis=1) / total
+    px = image.sum(axis=0) / total
+    y = np.arange(image.shape[0])
+    x = np.arange(image.shape[1])
+
+    cx = px @ x
+    cy = py @ y
+    return np.array([cx, cy, np.sqrt(px @ (x - cx)**2), np.sqrt(py @ (y - cy)**2)])
+
+
+def image_fingerprint(image, shape=FINGERPRINT_SHAPE):
+    """
+    Perceptual fingerprint of an isolated VCC image: its shape, the image
+    downsampled to shape and normalized to its peak, and its centroid and rms
+    size. Compare fingerprints with fingerprint_distance.
+
+    Images smaller than shape are kept at full resolution, such
+    fingerprints only match images of the same size.
+    """
+    h, w = image.shape
+
+    return {
+        "shape": np.array([h, w]),
+        "roi": _downsample(image, (min(h, shape[0]), min(w, shape[1]))),
+        "moments": _moments(image),
+    }
+
+
+def fingerprint_distance(fingerprint1, fingerprint2):
+    """
+    Similarity metric for image fingerprints, the largest of:
+    - the maximum difference between the normalized downsampled images
+    - the differences in centroid and rms size, relative to the image size
+    - the relative difference in image size
+
+    Noise on the same laser spot gives distances well below changes in its
+    shape or size. Use image_distance on recorded frames to choose a tolerance.
+    """
+    if fingerprint1["roi"].shape != fingerprint2["roi"].shape:
+        return np.inf
+
+    h, w = fingerprint1["shape"]
+    scale = np.array([w, h, w, h])
+
+    return max(
+        np.abs(fingerprint1["roi"] - fingerprint2["roi"]).max(),
+        (np.abs(fingerprint1["moments"] - fingerprint2["moments"]) / scale).max(),
+        (np.abs(fingerprint1["shape"] - fingerprint2["shape"]) / fingerprint1["shape"]).max(),
+    )
+
+
+def image_distance(image1, image2, shape=FINGERPRINT_SHAPE):
+    """
+    fingerprint_distance between two isolated images
+    """
+    return fingerprint_distance(image_fingerprint(image1, shape), image_fingerprint(image2, shape))
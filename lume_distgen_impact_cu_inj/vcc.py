@@ -0,0 +1,38 @@
+"""
+File transport for VCC frames, kept free of the image processing and particle
+dependencies of utils so that EPICS clients can import it cheaply.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+def save_vcc_array(array, directory):
+    """
+    Saves a VCC image in .npy format named by a hash of its contents, so that
+    flows can be passed a file path in place of a JSON list of pixels.
+
+    Returns the absolute path to the file written
+    
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(array.tobytes(), digest_size=16).hexdigest()
+    filename = os.path.abspath(os.path.join(directory, f"vcc_{array.dtype.str[1:]}_{digest}.npy"))
+
+    # identical frames are only written once
+    if not os.path.exists(filename):
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_filename, filename)
+
+    return filename
+
+
+def load_vcc_array(filename):
+    """
+    Memory-maps a VCC image written by save_vcc_array
+    """
+    return np.load(filename, mmap_mode="r")
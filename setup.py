@@ -25,6 +25,12 @@ setup(
                 lume_distgen_impact_cu_inj.model:ImpactModel",
             "lume_distgen_impact_cu_inj.flow=\
                 lume_distgen_impact_cu_inj.flow:flow",
-        ]
+            "lume_distgen_impact_cu_inj.batch_flow=\
+                lume_distgen_impact_cu_inj.flow:batch_flow",
+        ],
+        "console_scripts": [
+            "render-dashboard=lume_distgen_impact_cu_inj.dashboard:main",
+            "calibrate-impact=lume_distgen_impact_cu_inj.calibration:main",
+        ],
     },
 )